@@ -5,7 +5,7 @@ from enum import Enum
 import numpy as np
 
 from utils import read_file
-from intcode import Program, Status
+from intcode import Program
 
 
 class XYPair(NamedTuple):
@@ -42,18 +42,24 @@ class Robot:
         self.direction = Direction.UP
         self.pos = XYPair(0, 0)
         self.painted = {}
-        self.brain = Program(line)
+        self.result = []
+        self.brain = Program(line, input_provider=lambda: self.color_of_panel, output_sink=self.receive)
 
     @property
     def color_of_panel(self):
         return self.painted.get(self.pos, 0)
 
-    def process_input(self, input_value: int):
-        self.brain.add_input_value(input_value)
+    def paint(self, start_color: int):
+        """The brain reads the color of the panel under us whenever it wants input, so after the
+        first panel everything runs in one go"""
+        self.brain.add_input_value(start_color)
         self.brain.run()
 
-    def get_result(self) -> XYPair:
-        return XYPair(self.brain.get_output_value(), self.brain.get_output_value())
+    def receive(self, val: int):
+        self.result.append(val)
+        if len(self.result) == 2:
+            self.process_result(XYPair(*self.result))
+            self.result.clear()
 
     def process_result(self, value: XYPair):
         self.painted[self.pos] = value.x
@@ -74,17 +80,11 @@ def main():
     data = read_file(filename)
 
     robot = Robot(data[0])
-    robot.process_input(0)
-    while robot.brain.status != Status.TERMINATED:
-        robot.process_result(robot.get_result())
-        robot.process_input(robot.color_of_panel)
+    robot.paint(0)
     print(f"The number of painted tiles is {len(robot.painted)}")
 
     robot = Robot(data[0])
-    robot.process_input(1)
-    while robot.brain.status != Status.TERMINATED:
-        robot.process_result(robot.get_result())
-        robot.process_input(robot.color_of_panel)
+    robot.paint(1)
     robot.display_painted_tiles()
 
 
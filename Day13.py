@@ -5,7 +5,7 @@ from typing import NamedTuple, Tuple
 
 import numpy as np
 
-from intcode import Program, Status
+from intcode import Program
 from utils import read_file
 
 
@@ -24,9 +24,10 @@ class Tile(int, Enum):
 
 class Arcade:
     def __init__(self, line: str):
-        self.program = Program(line)
+        self.program = Program(line, input_provider=self.get_joystick_position, output_sink=self.draw)
         self.grid = np.zeros((36, 24), dtype=int)
         self.score = 0
+        self.pending = []
 
     @property
     def ball_position(self) -> Tuple[int, int]:
@@ -42,23 +43,26 @@ class Arcade:
             else 1 if self.ball_position[0] > self.paddle_position[0] \
             else 0
 
+    def draw(self, val: int):
+        """Output arrives a value at a time, so hold on to it until we have a whole (x, y, tile)"""
+        self.pending.append(val)
+        if len(self.pending) < 3:
+            return
+        x, y, val = self.pending
+        self.pending.clear()
+        if XYPair(x, y) == XYPair(-1, 0):
+            self.score = val
+        else:
+            self.grid[x, y] = Tile(val).value
+
     def run(self):
         self.program.run()
-        while self.program.outputs:
-            pos = XYPair(self.program.get_output_value(), self.program.get_output_value())
-            if pos == XYPair(-1, 0):
-                self.score = self.program.get_output_value()
-            else:
-                tile = Tile(self.program.get_output_value())
-                self.grid[pos.x, pos.y] = tile.value
 
     def play_game(self):
-        """Set it up so we can play for free and set up the board"""
+        """Set it up so we can play for free. The joystick is read whenever the game asks for input,
+        so the whole game runs in one go."""
         self.program.memory[0] = 2
         self.run()
-        while self.program.status not in [Status.TERMINATED]:
-            self.program.add_input_value(self.get_joystick_position())
-            self.run()
 
 
 def main():
@@ -57,14 +57,16 @@ class Grid:
     def find_oxygen_tank(self):
         inital_pos = XYPair(0, 0)
         self.visited.add(inital_pos)
-        self.explore(inital_pos)
+        self.explore(inital_pos, self.droid)
 
-    def explore(self, pos: XYPair, direction: Direction = None, level: int = 1):
+    def explore(self, pos: XYPair, droid: Program, level: int = 1):
+        """Each step is taken by a fork of the droid, so there's no need to back up afterwards"""
         directions_to_explore = [d for d in Direction if pos + d.deltas not in self.visited]
         for d in directions_to_explore:
             new_pos = pos + d.deltas
             self.visited.add(new_pos)
-            status_code = self.execute_command(d)
+            branch = droid.fork()
+            status_code = self.execute_command(branch, d)
             if status_code == StatusCode.WALL:
                 self.grid[(new_pos.x + SIZE//2, new_pos.y + SIZE//2)] = 1
             elif status_code in [StatusCode.SPACE, StatusCode.OXYGEN_TANK]:
@@ -72,16 +74,10 @@ class Grid:
                     self.distance_to_tank = level
                     self.tank_pos = XYPair(new_pos.x + SIZE//2, new_pos.y + SIZE//2)
                     self.grid[(new_pos.x + SIZE//2, new_pos.y + SIZE//2)] = 2
-                self.explore(new_pos, d, level + 1)
+                self.explore(new_pos, branch, level + 1)
             else:
                 raise ValueError(f"Unexpected Status Code!")
 
-        if level > 1:
-            # We're backing up so this should return a space
-            status_code = self.execute_command(direction.opposite())
-            if status_code != StatusCode.SPACE:
-                raise ValueError(f"No space to back up!")
-
     def fill_with_oxygen(self):
         self.visited = set()
         self.visited.add(self.tank_pos)
@@ -101,10 +97,11 @@ class Grid:
                 levels.append(self.flood_fill(new_pos, minutes + 1))
         return max(levels)
 
-    def execute_command(self, direction: Direction) -> StatusCode:
-        self.droid.add_input_value(direction.value)
-        self.droid.run()
-        return StatusCode(self.droid.get_output_value())
+    @staticmethod
+    def execute_command(droid: Program, direction: Direction) -> StatusCode:
+        droid.add_input_value(direction.value)
+        droid.run()
+        return StatusCode(droid.get_output_value())
 
 
 def main():
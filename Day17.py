@@ -5,6 +5,7 @@ from typing import NamedTuple, List, Dict, Union
 
 import numpy as np
 
+from ascii import Decoder
 from intcode import Program, Status
 from utils import read_file
 
@@ -79,18 +80,12 @@ class ASCII:
 
     def _populate_grid(self):
         self.program.run()
-        i, j = 0, 0
-        while self.program.outputs:
-            val = self.program.get_output_value()
-            if val == 10:
-                i += 1
-                j = 0
-            else:
-                self.grid[i, j] = 1 if val != 46 else 0
-                if val not in [35, 46]:
+        for i, row in enumerate(Decoder().feed(self.program.drain())):
+            for j, char in enumerate(row):
+                self.grid[i, j] = 1 if char != '.' else 0
+                if char not in '#.':
                     self.robot_pos = XYPair(i, j)
-                    self.robot_dir = Direction(chr(val))
-                j += 1
+                    self.robot_dir = Direction(char)
 
     def _build_graph(self) -> Dict[XYPair, List[XYPair]]:
         nodes = {}
@@ -211,19 +206,14 @@ class ASCII:
         self.program.memory[0] = 2
         self.program.run()
 
-        for ch in main_routine:
-            self.program.add_input_value(ord(ch))
-        self.program.add_input_value(10)
+        self.program.feed_bytes(main_routine.encode() + b'\n')
         self.program.run()
 
         for function in functions:
-            for ch in functions[function]:
-                self.program.add_input_value(ord(ch))
-            self.program.add_input_value(10)
+            self.program.feed_bytes(functions[function].encode() + b'\n')
             self.program.run()
 
-        self.program.add_input_value(ord('n'))
-        self.program.add_input_value(10)
+        self.program.feed_bytes(b'n\n')
         self.program.run()
         return self.program.outputs[-1]
 
@@ -3,7 +3,11 @@ from __future__ import annotations
 from typing import NamedTuple, Tuple
 import numpy as np
 
-from intcode import Program
+from batch import ProgramBatch
+from image_cache import ImageCache
+from intcode import Engine
+from memo import RunMemo
+from program_pool import ProgramPool
 from utils import read_file
 
 SIZE = 50
@@ -19,23 +23,22 @@ class XYPair(NamedTuple):
 
 class TractorBeam:
     def __init__(self, line: str):
-        self.line = line
-        self.program = Program(line)
+        self.pool = ProgramPool(ImageCache().load(line), Engine.THREADED)
+        self.memo = RunMemo()
         self.grid = np.zeros((SIZE, SIZE), dtype=int)
         self.slope = None
         self.intercept = None
 
     def test_point(self, x: int, y: int) -> int:
-        self.program = Program(self.line)
-        for val in [x, y]:
-            self.program.add_input_value(val)
-        self.program.run()
-        return self.program.get_output_value()
+        """get_next_left_bound keeps probing points it has already seen, so those are remembered"""
+        return self.memo.run(self.pool, (x, y))[0]
 
     def scan_grid(self):
-        for y in range(0, SIZE):
-            for x in range(SIZE):
-                self.grid[x, y] = self.test_point(x, y)
+        points = [(x, y) for y in range(SIZE) for x in range(SIZE)]
+        probes = ProgramBatch(self.pool.initial_memory, points)
+        probes.run()
+        for (x, y), outputs in zip(points, probes.outputs):
+            self.grid[x, y] = outputs.popleft()
 
     def find_location(self):
         # Find lower left corner
@@ -3,8 +3,32 @@ from __future__ import annotations
 from typing import List
 
 from ascii import ASCII
+from springscript import SpringscriptSearch
 from utils import read_file
 
+# Scripts known to get the droid across; a search is only run for an image they fail on
+SCRIPTS = {
+    'WALK': [
+        "NOT B J",
+        "NOT C T",
+        "OR T J",
+        "AND D J",
+        "NOT A T",
+        "OR T J",
+        "WALK"
+    ],
+    'RUN': [
+        "NOT B J",
+        "NOT C T",
+        "OR T J",
+        "AND D J",
+        "AND H J",
+        "NOT A T",
+        "OR T J",
+        "RUN"
+    ],
+}
+
 
 class SpringDroid:
     def __init__(self, line: str):
@@ -22,30 +46,14 @@ def main():
     filename = 'input/Day21.txt'
     data = read_file(filename)
 
-    springdroid = SpringDroid(data[0])
-    commands = [
-        "NOT B J",
-        "NOT C T",
-        "OR T J",
-        "AND D J",
-        "NOT A T",
-        "OR T J",
-        "WALK"
-    ]
-    print(f"The answer to Part 1 is {springdroid.execute_program(commands)}")
-
-    springdroid = SpringDroid(data[0])
-    commands = [
-        "NOT B J",
-        "NOT C T",
-        "OR T J",
-        "AND D J",
-        "AND H J",
-        "NOT A T",
-        "OR T J",
-        "RUN"
-    ]
-    print(f"The answer to Part 2 is {springdroid.execute_program(commands)}")
+    for part, (mode, commands) in enumerate(SCRIPTS.items(), start=1):
+        springdroid = SpringDroid(data[0])
+        damage = springdroid.execute_program(commands)
+        if damage is None:
+            # The droid fell, so this image needs a script of its own
+            springdroid = SpringDroid(data[0])
+            damage = springdroid.execute_program(SpringscriptSearch(data[0], mode).find())
+        print(f"The answer to Part {part} is {damage}")
 
 
 if __name__ == '__main__':
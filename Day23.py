@@ -2,13 +2,15 @@ from __future__ import annotations
 
 from typing import List, Tuple
 
+from image_cache import ImageCache
 from intcode import Program
 from utils import read_file
 
 
 class Network:
     def __init__(self, line: str):
-        self.computers = [Program(line) for _ in range(50)]
+        image = ImageCache().load(line)
+        self.computers = [Program.from_image(image) for _ in range(50)]
         for i, computer in enumerate(self.computers):
             computer.add_input_value(i)
             computer.run()
@@ -58,11 +60,8 @@ class Network:
     def read_packets(self):
         packets = []
         for id in range(50):
-            while len(self.computers[id].outputs) >= 3:
-                addr = self.computers[id].get_output_value()
-                x = self.computers[id].get_output_value()
-                y = self.computers[id].get_output_value()
-                packets.append((addr, x, y))
+            outputs = self.computers[id].drain(len(self.computers[id].outputs) // 3 * 3)
+            packets.extend(zip(outputs[0::3], outputs[1::3], outputs[2::3]))
         return packets
 
 
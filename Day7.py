@@ -1,55 +1,33 @@
 from __future__ import annotations
 
-from typing import Tuple
+from typing import List, Tuple
 from itertools import permutations
 
 from utils import read_file
-from intcode import Program, Status
+from batch import ProgramBatch
 
 
-class Amplifier:
-    def __init__(self, line: str, phase: int):
-        self.program = Program(line)
-        self.add_input(phase)
-        self.next = None
+class AmplifierBatch:
+    """Runs every phase permutation at once, with one lane per permutation in each amplifier's batch"""
+    def __init__(self, line: str, phase_permutations: List[Tuple]):
+        self.amplifiers = [ProgramBatch(line, [[phases[i]] for phases in phase_permutations])
+                           for i in range(len(phase_permutations[0]))]
+        for lane in range(len(phase_permutations)):
+            self.amplifiers[0].add_input_value(lane, 0)
 
     @property
-    def outputs(self):
-        return self.program.outputs
+    def thruster_outputs(self) -> List[int]:
+        return [inputs.pop() for inputs in self.amplifiers[0].inputs]
 
-    @property
-    def status(self):
-        return self.program.status
-
-    def run(self):
-        self.program.run()
-
-    def add_input(self, val: int):
-        self.program.input_handler.add_input(val)
-
-    def get_output(self):
-        return self.program.outputs.popleft()
-
-
-class AmplifierPipeline:
-    def __init__(self, line: str, phases: Tuple):
-        self.amplifiers = [Amplifier(line, phase) for phase in phases]
-        for i in range(len(self.amplifiers)-1):
-            self.amplifiers[i].next = self.amplifiers[i+1]
-        self.amplifiers[len(self.amplifiers)-1].next = self.amplifiers[0]
-        self.amplifiers[0].add_input(0)
-
-    @property
-    def thruster_output(self):
-        return self.amplifiers[0].program.input_handler.values.pop()
-
-    def run(self):
-        while not all([amp.status == Status.TERMINATED for amp in self.amplifiers]):
-            for amp in self.amplifiers:
+    def run(self) -> List[int]:
+        while not all([amp.terminated for amp in self.amplifiers]):
+            for i, amp in enumerate(self.amplifiers):
                 amp.run()
-                while amp.outputs:
-                    amp.next.add_input(amp.get_output())
-        return self.thruster_output
+                next_amp = self.amplifiers[(i + 1) % len(self.amplifiers)]
+                for lane, outputs in enumerate(amp.outputs):
+                    while outputs:
+                        next_amp.add_input_value(lane, outputs.popleft())
+        return self.thruster_outputs
 
 
 def main():
@@ -57,11 +35,11 @@ def main():
     data = read_file(filename)
 
     phases = [ele for ele in range(5)]
-    results = [AmplifierPipeline(data[0], p).run() for p in permutations(phases, 5)]
+    results = AmplifierBatch(data[0], list(permutations(phases, 5))).run()
     print(f"The answer to part 1 is {max(results)}")
 
     phases = [ele for ele in range(5, 10)]
-    results = [AmplifierPipeline(data[0], p).run() for p in permutations(phases, 5)]
+    results = AmplifierBatch(data[0], list(permutations(phases, 5))).run()
     print(f"The answer to Part 2 is {max(results)}")
 
 
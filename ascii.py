@@ -1,24 +1,66 @@
 from __future__ import annotations
 
+from typing import Generator, Optional, Sequence
+
 from intcode import Program
 
 
+class Decoder:
+    """Turns output values into lines of text as they arrive, in bulk. A value that isn't ASCII ends the text
+    and is kept in `result`. Text waiting for the rest of its line sits in a bytearray, so a big frame costs
+    a decode per line rather than a string built up a character at a time."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.result: Optional[int] = None
+
+    def feed(self, vals: Sequence[int]) -> Generator[str, None, Optional[int]]:
+        """Yields each line that vals complete, without its newline, and returns the result once it has arrived.
+        Anything after the result is ignored."""
+        # A list, as bytes() would copy the raw memory of an array('q') from drain rather than its values
+        vals = [] if self.result is not None else list(vals)
+        try:
+            chunk = bytes(vals)
+        except ValueError:
+            chunk = None
+        if chunk is None or not chunk.isascii():
+            end = next(i for i, val in enumerate(vals) if not 0 <= val < 128)
+            self.result, chunk = vals[end], bytes(vals[:end])
+
+        buffer, start = self.buffer, 0
+        buffer += chunk
+        newline = buffer.find(b'\n')
+        try:
+            while newline != -1:
+                line, start = buffer[start:newline], newline + 1
+                yield line.decode()
+                newline = buffer.find(b'\n', start)
+        finally:
+            # Also when the caller stops early, so the lines it has seen aren't yielded again
+            del buffer[:start]
+        return self.result
+
+    def flush(self) -> str:
+        """The text after the last newline"""
+        text = self.buffer.decode()
+        self.buffer.clear()
+        return text
+
+
 class ASCII:
     def __init__(self, line: str):
         self.program = Program(line)
+        self.decoder = Decoder()
 
     def execute_command(self, command: str):
-        for ch in command:
-            self.program.add_input_value(ord(ch))
-        self.program.add_input_value(10)
+        self.program.feed_bytes(command.encode() + b'\n')
         self.program.run()
 
-    def display_output(self):
-        msg = ''
-        while self.program.outputs:
-            try:
-                output = self.program.get_output_value()
-                msg += chr(output)
-            except ValueError:
-                return output
-        print(msg)
+    def lines(self) -> Generator[str, None, Optional[int]]:
+        """The lines of text waiting in the program's output, returning its result if it has produced one"""
+        return (yield from self.decoder.feed(self.program.drain()))
+
+    def display_output(self) -> Optional[int]:
+        for line in self.lines():
+            print(line)
+        return self.decoder.result
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Optional, Protocol, Union
+
+from intcode import Engine, Program, Status
+
+SLICE_STEPS = 10_000
+
+
+class Channel(Protocol):
+    async def get(self) -> int:
+        ...
+
+    async def put(self, val: int):
+        ...
+
+
+class AsyncProgram(Program):
+    """A program that awaits its input from a channel and puts its output onto one, so a network of programs
+    can be wired together and left to the event loop. It runs slice_steps instructions at a time, handing on
+    its output and letting other tasks run after each slice, so a program that computes for a long time
+    doesn't hold up the others. Any object with async get() and put() will do as a channel; by default each
+    end is an asyncio.Queue. With an idle_input, a program that wants input its channel doesn't have yet gets
+    that value instead of waiting, like the -1 of Day23's network; this needs a channel with get_nowait()."""
+
+    def __init__(self, line: Union[str, List[int]], engine: Engine = Engine.INTERPRETER,
+                 inputs: Optional[Channel] = None, outputs: Optional[Channel] = None,
+                 slice_steps: int = SLICE_STEPS, idle_input: Optional[int] = None):
+        super().__init__(line, engine)
+        self.input_channel = inputs if inputs is not None else asyncio.Queue()
+        self.output_channel = outputs if outputs is not None else asyncio.Queue()
+        self.slice_steps = slice_steps
+        self.idle_input = idle_input
+        self.waiting = False
+
+    async def run_async(self):
+        """Runs until the program terminates"""
+        while True:
+            self.run(max_steps=self.slice_steps)
+            while self.outputs:
+                await self.output_channel.put(self.get_output_value())
+            if self.status == Status.TERMINATED:
+                return
+            if self.status == Status.YIELDED:
+                await asyncio.sleep(0)
+            elif self.idle_input is not None:
+                try:
+                    self.add_input_value(self.input_channel.get_nowait())
+                except asyncio.QueueEmpty:
+                    self.add_input_value(self.idle_input)
+                    await asyncio.sleep(0)
+            else:
+                self.waiting = True
+                self.add_input_value(await self.input_channel.get())
+                self.waiting = False
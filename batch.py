@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Iterable, List, Union
+
+import numpy as np
+
+from intcode import PAGE_SIZE, OpcodeType, Operator, ParameterMode, Status
+
+
+class ProgramBatch:
+    """Runs one copy of an intcode image per lane, each with its own inputs, in lockstep.
+    On every tick, the lanes that sit at the same pointer with the same opcode execute it as a single
+    numpy operation; lanes that diverge simply end up in smaller groups. Memory is a dense (lanes, words)
+    int64 array that grows a page at a time, so values have to fit in 64 bits."""
+
+    def __init__(self, line: Union[str, List[int]], inputs: Iterable[Iterable[int]]):
+        image = [int(ele) for ele in line.split(',')] if isinstance(line, str) else line
+        self.inputs: List[Deque[int]] = [deque(lane_inputs) for lane_inputs in inputs]
+        self.outputs: List[Deque[int]] = [deque() for _ in self.inputs]
+        self.size = len(self.inputs)
+        self.memory = np.zeros((self.size, self.capacity(len(image))), dtype=np.int64)
+        self.memory[:, :len(image)] = image
+        self.ptr = np.zeros(self.size, dtype=np.int64)
+        self.relative_base = np.zeros(self.size, dtype=np.int64)
+        self.statuses = [Status.PROCESSING] * self.size
+        self.active = np.ones(self.size, dtype=bool)
+
+    @property
+    def terminated(self) -> bool:
+        return all(status == Status.TERMINATED for status in self.statuses)
+
+    @staticmethod
+    def capacity(width: int) -> int:
+        return -(-width // PAGE_SIZE) * PAGE_SIZE
+
+    def add_input_value(self, lane: int, val: int):
+        self.inputs[lane].append(val)
+
+    def get_output_value(self, lane: int) -> int:
+        return self.outputs[lane].popleft()
+
+    def run(self):
+        for lane, status in enumerate(self.statuses):
+            if status == Status.WAITING_FOR_INPUT and self.inputs[lane]:
+                self.statuses[lane], self.active[lane] = Status.PROCESSING, True
+        while self.active.any():
+            self.tick()
+
+    def tick(self):
+        lanes = np.flatnonzero(self.active)
+        ptrs = self.ptr[lanes]
+        opcodes = self.read(lanes, ptrs)
+        if ptrs.min() == ptrs.max() and opcodes.min() == opcodes.max():
+            self.execute(lanes, int(ptrs[0]), Operator.get_operator(int(opcodes[0])))
+            return
+        instructions, groups = np.unique(np.stack([ptrs, opcodes]), axis=1, return_inverse=True)
+        for i, (ptr, opcode) in enumerate(instructions.T):
+            self.execute(lanes[groups.ravel() == i], int(ptr), Operator.get_operator(int(opcode)))
+
+    def execute(self, lanes: np.ndarray, ptr: int, op: Operator):
+        num_params = op.opcode_type.num_params
+        self.grow(ptr + 1 + num_params)
+        params = self.memory[lanes, ptr + 1:ptr + 1 + num_params]
+        addresses = [self._get_parameter_pos(lanes, ptr, op.param_modes[i], params[:, i], i)
+                     for i in range(num_params)]
+        values = [params[:, i] if op.param_modes[i] == ParameterMode.IMMEDIATE else self.read(lanes, addresses[i])
+                  for i in range(num_params)]
+        nxt = ptr + 1 + num_params
+
+        if op.opcode_type == OpcodeType.ADD:
+            total = values[0] + values[1]
+            if np.any((values[0] ^ total) & (values[1] ^ total) < 0):
+                raise OverflowError("Sum does not fit in 64 bits")
+            self.write(lanes, addresses[2], total)
+        elif op.opcode_type == OpcodeType.MULTIPLY:
+            product = values[0] * values[1]
+            nonzero = values[0] != 0
+            if np.any(product[nonzero] // values[0][nonzero] != values[1][nonzero]):
+                raise OverflowError("Product does not fit in 64 bits")
+            self.write(lanes, addresses[2], product)
+        elif op.opcode_type == OpcodeType.INPUT:
+            self._input(lanes, ptr, addresses[0])
+            return
+        elif op.opcode_type == OpcodeType.OUTPUT:
+            for lane, val in zip(lanes, values[0]):
+                self.outputs[lane].append(int(val))
+        elif op.opcode_type == OpcodeType.JUMP_IF_TRUE:
+            self.ptr[lanes] = np.where(values[0] != 0, values[1], nxt)
+            return
+        elif op.opcode_type == OpcodeType.JUMP_IF_FALSE:
+            self.ptr[lanes] = np.where(values[0] == 0, values[1], nxt)
+            return
+        elif op.opcode_type == OpcodeType.LESS_THAN:
+            self.write(lanes, addresses[2], (values[0] < values[1]).astype(np.int64))
+        elif op.opcode_type == OpcodeType.EQUALS:
+            self.write(lanes, addresses[2], (values[0] == values[1]).astype(np.int64))
+        elif op.opcode_type == OpcodeType.ADJUST_RELATIVE:
+            self.relative_base[lanes] += values[0]
+        elif op.opcode_type == OpcodeType.TERMINATE:
+            self.stop(lanes, Status.TERMINATED)
+            return
+        self.ptr[lanes] = nxt
+
+    def _input(self, lanes: np.ndarray, ptr: int, addresses: np.ndarray):
+        waiting = []
+        for lane, address in zip(lanes, addresses):
+            if self.inputs[lane]:
+                self.write(lane, address, self.inputs[lane].popleft())
+                self.ptr[lane] = ptr + 2
+            else:
+                waiting.append(lane)
+        self.stop(waiting, Status.WAITING_FOR_INPUT)
+
+    def stop(self, lanes: Iterable[int], status: Status):
+        for lane in lanes:
+            self.statuses[lane], self.active[lane] = status, False
+
+    def _get_parameter_pos(self, lanes: np.ndarray, ptr: int, mode: ParameterMode,
+                           params: np.ndarray, num_param: int) -> np.ndarray:
+        return np.full(len(lanes), ptr + 1 + num_param) if mode == ParameterMode.IMMEDIATE else \
+            params if mode == ParameterMode.POSITION else \
+            self.relative_base[lanes] + params
+
+    def read(self, lanes: np.ndarray, addresses: np.ndarray) -> np.ndarray:
+        """Like intcode.Memory, anything outside the memory written so far reads as 0"""
+        valid = (addresses >= 0) & (addresses < self.memory.shape[1])
+        return np.where(valid, self.memory[lanes, np.where(valid, addresses, 0)], 0)
+
+    def write(self, lanes: Union[int, np.ndarray], addresses: Union[int, np.ndarray], values: np.ndarray):
+        if np.any(addresses < 0):
+            raise IndexError(f"Invalid address: {np.min(addresses)}")
+        self.grow(int(np.max(addresses)) + 1)
+        self.memory[lanes, addresses] = values
+
+    def grow(self, width: int):
+        if width > self.memory.shape[1]:
+            extra = self.capacity(width) - self.memory.shape[1]
+            self.memory = np.pad(self.memory, ((0, 0), (0, extra)))
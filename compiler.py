@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Union
+
+from intcode import Engine, Memory, OpcodeType, Operator, ParameterMode, Program, Status
+
+MAX_BLOCK_LENGTH = 64
+MAX_RECOMPILES = 3
+
+
+class BlockCompiler:
+    """Turns the straight-line run of instructions starting at an address into Python source.
+    Blocks end at a jump, at TERMINATE, after an OUTPUT, at the first word that doesn't decode,
+    or at MAX_BLOCK_LENGTH. Ending after each OUTPUT lets a run stop exactly at an output count."""
+    ENDS_BLOCK = [OpcodeType.JUMP_IF_TRUE, OpcodeType.JUMP_IF_FALSE, OpcodeType.TERMINATE]
+    SPLITS_BLOCK = [OpcodeType.OUTPUT]
+
+    # Compiled blocks only reference self, so identical source can be shared by every program
+    functions: Dict[str, Callable[[Program], Optional[int]]] = {}
+
+    def __init__(self, memory: Memory, entry: int):
+        self.memory = memory
+        self.entry = entry
+        self.end = entry
+        self.lines: List[str] = []
+        self.reads = 0
+        self.size = 0
+
+    @property
+    def source(self) -> str:
+        return '\n'.join(self.lines)
+
+    def compile(self) -> Callable[[Program], Optional[int]]:
+        self.build()
+        function = self.functions.get(self.source)
+        if function is None:
+            namespace = {'Status': Status}
+            exec(self.source, namespace)
+            function = self.functions[self.source] = namespace['block']
+            function.size = self.size
+        return function
+
+    def build(self):
+        self.lines = [
+            'def block(self):',
+            '    mem, code_addresses, rb = self.memory, self.code_addresses, self.relative_base',
+            '    pages, writable = mem.pages, mem.writable',
+            '    handler, outputs = self.input_handler, self.outputs'
+        ]
+        ptr, ended = self.entry, False
+        for _ in range(MAX_BLOCK_LENGTH):
+            try:
+                op = Operator.get_operator(self.memory[ptr])
+            except (ValueError, IndexError):
+                if ptr == self.entry:
+                    raise
+                break
+            params = self.memory.get_range(ptr + 1, ptr + 1 + op.opcode_type.num_params)
+            self.emit(op, ptr, params)
+            self.size += 1
+            ptr += 1 + op.opcode_type.num_params
+            if op.opcode_type in self.ENDS_BLOCK:
+                ended = True
+                break
+            if op.opcode_type in self.SPLITS_BLOCK:
+                break
+        self.end = ptr
+        if not ended:
+            self.emit_exit(str(ptr))
+
+    def emit(self, op: Operator, ptr: int, params: List[int]):
+        r = [self.read(mode, param) for mode, param in zip(op.param_modes, params)]
+        nxt = ptr + 1 + op.opcode_type.num_params
+        self.lines.append(f'    # {ptr}: {op.opcode_type.name} {params}')
+        if op.opcode_type == OpcodeType.ADD:
+            self.emit_write(self.address(op, ptr, params, 2), f'{r[0]} + {r[1]}', nxt)
+        elif op.opcode_type == OpcodeType.MULTIPLY:
+            self.emit_write(self.address(op, ptr, params, 2), f'{r[0]} * {r[1]}', nxt)
+        elif op.opcode_type == OpcodeType.INPUT:
+            self.lines += [
+                '    if not handler.values and not handler.pull():',
+                '        self.relative_base = rb',
+                f'        self.ptr, self.status = {ptr}, Status.WAITING_FOR_INPUT',
+                '        return None'
+            ]
+            self.emit_write(self.address(op, ptr, params, 0), 'handler.get_input()', nxt)
+        elif op.opcode_type == OpcodeType.OUTPUT:
+            self.lines.append(f'    outputs.append({r[0]})')
+        elif op.opcode_type == OpcodeType.JUMP_IF_TRUE:
+            self.emit_exit(f'{r[1]} if {r[0]} != 0 else {nxt}')
+        elif op.opcode_type == OpcodeType.JUMP_IF_FALSE:
+            self.emit_exit(f'{r[1]} if {r[0]} == 0 else {nxt}')
+        elif op.opcode_type == OpcodeType.LESS_THAN:
+            self.emit_write(self.address(op, ptr, params, 2), f'1 if {r[0]} < {r[1]} else 0', nxt)
+        elif op.opcode_type == OpcodeType.EQUALS:
+            self.emit_write(self.address(op, ptr, params, 2), f'1 if {r[0]} == {r[1]} else 0', nxt)
+        elif op.opcode_type == OpcodeType.ADJUST_RELATIVE:
+            self.lines.append(f'    rb += {r[0]}')
+        elif op.opcode_type == OpcodeType.TERMINATE:
+            self.lines += [
+                '    self.relative_base = rb',
+                f'    self.ptr, self.status = {ptr}, Status.TERMINATED',
+                '    return None'
+            ]
+
+    def emit_write(self, address: str, value: str, nxt: int):
+        """A write that lands on compiled code leaves the block so the rest is recompiled before it runs"""
+        self.lines += [
+            f'    c = {address}',
+            *('    ' + line for line in Memory.write_source('c', value).split('\n')),
+            '    if c in code_addresses:',
+            '        self.relative_base = rb',
+            '        self.invalidate(c)',
+            f'        return {nxt}'
+        ]
+
+    def emit_exit(self, target: str):
+        self.lines += [
+            '    self.relative_base = rb',
+            f'    return {target}'
+        ]
+
+    def read(self, mode: ParameterMode, param: int) -> str:
+        self.reads += 1
+        return Memory.read_source(param) if mode == ParameterMode.POSITION else \
+            f'{param}' if mode == ParameterMode.IMMEDIATE else \
+            Memory.read_source(f'rb + {param}', f'a{self.reads}')
+
+    @staticmethod
+    def address(op: Operator, ptr: int, params: List[int], num_param: int) -> str:
+        mode = op.param_modes[num_param]
+        return f'{params[num_param]}' if mode == ParameterMode.POSITION else \
+            f'{ptr + 1 + num_param}' if mode == ParameterMode.IMMEDIATE else \
+            f'rb + {params[num_param]}'
+
+
+class CompiledProgram(Program):
+    """Runs intcode as compiled basic blocks, interpreting any block that keeps getting overwritten.
+    A step budget is counted in whole blocks, so it can be overrun by up to one block.
+    An output count is exact, since blocks end after every OUTPUT."""
+
+    def __init__(self, line: Union[str, List[int]], engine: Engine = Engine.INTERPRETER,
+                 input_provider: Optional[Callable[[], Optional[int]]] = None,
+                 output_sink: Optional[Callable[[int], None]] = None):
+        super().__init__(line, engine, input_provider, output_sink)
+        self.engines[self.engine] = self._run_compiled
+        self.limited_engines[self.engine] = self._run_compiled_for
+
+    def set_memory(self, memory: Memory):
+        super().set_memory(memory)
+        self.blocks: Dict[int, Callable[[Program], Optional[int]]] = {}
+        self.block_owners: Dict[int, List[int]] = defaultdict(list)
+        self.recompiles = Counter()
+
+    def inherit_code(self, other: CompiledProgram):
+        super().inherit_code(other)
+        self.blocks, self.recompiles = other.blocks.copy(), other.recompiles.copy()
+        self.block_owners = defaultdict(list, {addr: owners.copy() for addr, owners in other.block_owners.items()})
+
+    def _run_compiled(self):
+        blocks, ptr = self.blocks, self.ptr
+        self.status = Status.PROCESSING
+        while ptr is not None:
+            block = blocks.get(ptr)
+            if block is None:
+                block = self.compile(ptr)
+            ptr = block(self)
+
+    def _run_compiled_for(self, max_steps: float, until_outputs: float):
+        blocks, ptr, outputs, steps = self.blocks, self.ptr, self.outputs, 0
+        self.status = Status.PROCESSING
+        while ptr is not None and steps < max_steps and len(outputs) < until_outputs:
+            block = blocks.get(ptr)
+            if block is None:
+                block = self.compile(ptr)
+            steps += block.size
+            ptr = block(self)
+        if ptr is not None:
+            self.ptr, self.status = ptr, Status.YIELDED
+
+    def compile(self, entry: int) -> Callable[[Program], Optional[int]]:
+        if self.recompiles[entry] >= MAX_RECOMPILES:
+            block = self.blocks[entry] = lambda program: program.interpret(entry)
+            block.size = 1
+            return block
+        compiler = BlockCompiler(self.memory, entry)
+        block = self.blocks[entry] = compiler.compile()
+        for address in range(entry, compiler.end):
+            self.block_owners[address].append(entry)
+        self.code_addresses.update(range(entry, compiler.end))
+        return block
+
+    def interpret(self, ptr: int) -> Optional[int]:
+        self.ptr = ptr
+        self.step()
+        return self.ptr if self.status == Status.PROCESSING else None
+
+    def invalidate(self, pos: int):
+        super().invalidate(pos)
+        for entry in self.block_owners.pop(pos, []):
+            if self.blocks.pop(entry, None) is not None:
+                self.recompiles[entry] += 1
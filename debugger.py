@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from typing import Callable, List, Optional, Set, Tuple
+
+from disassembler import WRITES
+from intcode import NO_LIMIT, Operator, ParameterMode, Program, Status
+
+
+class Debugger:
+    """Pauses a program at breakpoints, at reads or writes of watched addresses and whenever a hook returns True.
+    Attaching swaps the program's engines for a checking interpreter loop, the way Program.enable_stats does,
+    so a program without a debugger runs exactly as fast as before. A paused program has Status.PAUSED and
+    sits before the instruction that triggered the pause; the next run executes it without pausing again."""
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.breakpoints: Set[int] = set()
+        self.read_watches: Set[int] = set()
+        self.write_watches: Set[int] = set()
+        self.hooks: List[Callable[[Program], bool]] = []
+        self.reason: Optional[str] = None
+        self.resume_ptr: Optional[int] = None
+        self.engines, self.limited_engines = program.engines, program.limited_engines
+        program.engines = dict.fromkeys(program.engines, self.run)
+        program.limited_engines = dict.fromkeys(program.limited_engines, self.run)
+
+    def detach(self):
+        self.program.engines, self.program.limited_engines = self.engines, self.limited_engines
+
+    def break_at(self, address: int):
+        self.breakpoints.add(address)
+
+    def watch(self, address: int, read: bool = False, write: bool = True):
+        if read:
+            self.read_watches.add(address)
+        if write:
+            self.write_watches.add(address)
+
+    def when(self, hook: Callable[[Program], bool]):
+        self.hooks.append(hook)
+
+    def run(self, max_steps: float = NO_LIMIT, until_outputs: float = NO_LIMIT):
+        program, steps = self.program, 0
+        while steps < max_steps and len(program.outputs) < until_outputs:
+            if program.ptr != self.resume_ptr and self.should_pause():
+                self.resume_ptr, program.status = program.ptr, Status.PAUSED
+                return
+            program.step()
+            if program.status != Status.PROCESSING:
+                return
+            self.resume_ptr = None
+            steps += 1
+        program.status = Status.YIELDED
+
+    def should_pause(self) -> bool:
+        program = self.program
+        if program.ptr in self.breakpoints:
+            self.reason = f"breakpoint at {program.ptr}"
+            return True
+        if self.read_watches or self.write_watches:
+            op, params = program.fetch()
+            reads, writes = self.accesses(op, params)
+            for addresses, watches, kind in [(reads, self.read_watches, 'read'), (writes, self.write_watches, 'write')]:
+                hit = next((address for address in addresses if address in watches), None)
+                if hit is not None:
+                    self.reason = f"{kind} of {hit} at {program.ptr}"
+                    return True
+        for hook in self.hooks:
+            if hook(program):
+                self.reason = f"{getattr(hook, '__name__', 'hook')} at {program.ptr}"
+                return True
+        return False
+
+    def accesses(self, op: Operator, params: Tuple[int, ...]) -> Tuple[List[int], List[int]]:
+        """Addresses the instruction at the pointer reads and writes"""
+        program = self.program
+        positions = [
+            program.ptr + 1 + i if mode == ParameterMode.IMMEDIATE else
+            param if mode == ParameterMode.POSITION else
+            program.relative_base + param
+            for i, (mode, param) in enumerate(zip(op.param_modes, params))
+        ]
+        if op.opcode_type in WRITES:
+            return positions[:-1], positions[-1:]
+        return positions, []
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import argparse
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from intcode import OpcodeType, Operator, ParameterMode
+from utils import read_file
+
+WRITES = [OpcodeType.ADD, OpcodeType.MULTIPLY, OpcodeType.INPUT, OpcodeType.LESS_THAN, OpcodeType.EQUALS]
+JUMPS = [OpcodeType.JUMP_IF_TRUE, OpcodeType.JUMP_IF_FALSE]
+FOLDABLE = [OpcodeType.ADD, OpcodeType.MULTIPLY, OpcodeType.LESS_THAN, OpcodeType.EQUALS]
+
+
+class Instruction(NamedTuple):
+    address: int
+    op: Operator
+    params: Tuple[int, ...]
+
+    @property
+    def opcode_type(self) -> OpcodeType:
+        return self.op.opcode_type
+
+    @property
+    def size(self) -> int:
+        return 1 + len(self.params)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.size
+
+    @property
+    def destination(self) -> Optional[Tuple[ParameterMode, int]]:
+        """Mode and parameter of the address this instruction writes to, if it writes at all"""
+        if self.opcode_type not in WRITES:
+            return None
+        return self.op.param_modes[-1], self.params[-1]
+
+    @property
+    def static_destination(self) -> Optional[int]:
+        """The address written to when it is known without running the program"""
+        if self.destination is None:
+            return None
+        mode, param = self.destination
+        return param if mode == ParameterMode.POSITION else \
+            self.end - 1 if mode == ParameterMode.IMMEDIATE else \
+            None
+
+    def operand(self, i: int) -> str:
+        mode, param = self.op.param_modes[i], self.params[i]
+        return f"[{param}]" if mode == ParameterMode.POSITION else \
+            f"{param}" if mode == ParameterMode.IMMEDIATE else \
+            f"[rb{param:+d}]"
+
+    def __str__(self) -> str:
+        operands = ", ".join(self.operand(i) for i in range(len(self.params)))
+        return f"{self.address:>6}: {self.opcode_type.name:<15} {operands}"
+
+
+class BasicBlock:
+    """A run of instructions that is only ever entered at the top and left at the bottom.
+    A block whose exit depends on a value only known at run time, like a return address, is indirect."""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.instructions: List[Instruction] = []
+        self.successors: Set[int] = set()
+        self.predecessors: Set[int] = set()
+        self.indirect = False
+
+    @property
+    def end(self) -> int:
+        return self.instructions[-1].end if self.instructions else self.start
+
+    @property
+    def last(self) -> Instruction:
+        return self.instructions[-1]
+
+    def __str__(self) -> str:
+        exits = [str(successor) for successor in sorted(self.successors)] + (['?'] if self.indirect else [])
+        return f"block {self.start}-{self.end - 1} -> {', '.join(exits) or 'halt'}"
+
+
+class Disassembler:
+    """Static analysis of an intcode image.
+    Recursive descent follows jumps whose targets are known without running the program: immediate targets,
+    and position-mode targets read from addresses that no instruction writes to. Targets read relative to the
+    base, which is how the intcode calling convention returns, are unknown, so return sites are found instead
+    by looking for constants pushed onto the stack that point back into the image."""
+
+    def __init__(self, line: Union[str, List[int]]):
+        self.image = [int(ele) for ele in line.split(',')] if isinstance(line, str) else list(line)
+        # Addresses written by some instruction of a linear pass that are known without running the program
+        self.written: Set[int] = {
+            instruction.static_destination for instruction in self.linear()
+            if isinstance(instruction, Instruction) and instruction.static_destination is not None
+        }
+
+    def __getitem__(self, address: int) -> int:
+        return self.image[address] if 0 <= address < len(self.image) else 0
+
+    def decode(self, address: int) -> Optional[Instruction]:
+        """The instruction at an address, or None if the word there isn't a valid opcode"""
+        if not 0 <= address < len(self.image):
+            return None
+        try:
+            op = Operator.get_operator(self.image[address])
+        except ValueError:
+            return None
+        params = tuple(self[i] for i in range(address + 1, address + 1 + op.opcode_type.num_params))
+        return Instruction(address, op, params)
+
+    def linear(self) -> Iterator[Union[Instruction, int]]:
+        """Decodes the whole image from the top, yielding the address of any word that doesn't decode as data"""
+        address = 0
+        while address < len(self.image):
+            instruction = self.decode(address)
+            if instruction is None:
+                yield address
+                address += 1
+            else:
+                yield instruction
+                address = instruction.end
+
+    def recursive(self, entries: Iterable[int] = (0,), return_sites: bool = True) -> Dict[int, Instruction]:
+        """Decodes only what is reachable from the entries, keyed by address"""
+        code: Dict[int, Instruction] = {}
+        todo = deque(entries)
+        while todo:
+            address = todo.popleft()
+            while address not in code:
+                instruction = self.decode(address)
+                if instruction is None:
+                    break
+                code[address] = instruction
+                todo.extend(self.jump_targets(instruction))
+                if return_sites:
+                    todo.extend(self.return_sites(instruction))
+                if not self.falls_through(instruction):
+                    break
+                address = instruction.end
+        return code
+
+    def jump_targets(self, instruction: Instruction) -> List[int]:
+        if instruction.opcode_type not in JUMPS or self.branch_taken(instruction) is False:
+            return []
+        target = self.target(instruction)
+        return [] if target is None else [target]
+
+    def target(self, instruction: Instruction) -> Optional[int]:
+        mode, param = instruction.op.param_modes[1], instruction.params[1]
+        return param if mode == ParameterMode.IMMEDIATE else \
+            self[param] if mode == ParameterMode.POSITION and param not in self.written else \
+            None
+
+    def branch_taken(self, instruction: Instruction) -> Optional[bool]:
+        """Whether a jump always (True) or never (False) goes to its target, or None if that depends on the run"""
+        if instruction.op.param_modes[0] != ParameterMode.IMMEDIATE:
+            return None
+        return (instruction.params[0] != 0) == (instruction.opcode_type == OpcodeType.JUMP_IF_TRUE)
+
+    def falls_through(self, instruction: Instruction) -> bool:
+        return instruction.opcode_type != OpcodeType.TERMINATE and \
+            not (instruction.opcode_type in JUMPS and self.branch_taken(instruction))
+
+    def return_sites(self, instruction: Instruction) -> List[int]:
+        """A constant pushed onto the stack, e.g. by 21101,0,X,rb, is taken as a return address
+        if it points into the image"""
+        if instruction.opcode_type not in [OpcodeType.ADD, OpcodeType.MULTIPLY] or \
+                instruction.op.param_modes[2] != ParameterMode.RELATIVE or \
+                instruction.op.param_modes[0] != ParameterMode.IMMEDIATE or \
+                instruction.op.param_modes[1] != ParameterMode.IMMEDIATE:
+            return []
+        identity = 0 if instruction.opcode_type == OpcodeType.ADD else 1
+        a, b = instruction.params[:2]
+        value = b if a == identity else a if b == identity else None
+        return [value] if value is not None and 0 < value < len(self.image) else []
+
+    def cfg(self, entries: Iterable[int] = (0,)) -> Dict[int, BasicBlock]:
+        """Basic blocks of the reachable code, keyed by their first address"""
+        entries = list(entries)
+        code = self.recursive(entries)
+        leaders = set(entries)
+        for instruction in code.values():
+            if instruction.opcode_type in JUMPS or instruction.opcode_type == OpcodeType.TERMINATE:
+                leaders.update(self.jump_targets(instruction))
+                leaders.add(instruction.end)
+        leaders.update(address for instruction in code.values() for address in self.return_sites(instruction))
+
+        blocks: Dict[int, BasicBlock] = {}
+        for start in sorted(leader for leader in leaders if leader in code):
+            block = blocks[start] = BasicBlock(start)
+            address = start
+            while address in code:
+                instruction = code[address]
+                block.instructions.append(instruction)
+                address = instruction.end
+                if address in leaders or not self.falls_through(instruction) or instruction.opcode_type in JUMPS:
+                    break
+            last = block.last
+            block.successors.update(self.jump_targets(last))
+            if self.falls_through(last) and last.end in code:
+                block.successors.add(last.end)
+            if last.opcode_type in JUMPS and self.target(last) is None and self.branch_taken(last) is not False:
+                block.indirect = True
+        for block in blocks.values():
+            for successor in block.successors:
+                if successor in blocks:
+                    blocks[successor].predecessors.add(block.start)
+        return blocks
+
+    def self_modifying_writes(self, code: Dict[int, Instruction]) -> List[Tuple[int, int]]:
+        """(writer, target) for every instruction whose known destination lies inside decoded code"""
+        covered = {address for instruction in code.values()
+                   for address in range(instruction.address, instruction.end)}
+        return [(instruction.address, instruction.static_destination) for instruction in code.values()
+                if instruction.static_destination in covered]
+
+    def foldable_regions(self, blocks: Dict[int, BasicBlock]) -> List[Tuple[int, int]]:
+        """(start, end) of each run of arithmetic or comparisons whose operands are all constant:
+        immediates, or reads of addresses that nothing writes to. This assumes that relative writes
+        stay on the stack, which holds for the intcode calling convention."""
+        regions = []
+        for block in blocks.values():
+            start = None
+            for instruction in block.instructions:
+                if self.is_constant(instruction):
+                    start = instruction.address if start is None else start
+                    continue
+                if start is not None:
+                    regions.append((start, instruction.address))
+                    start = None
+            if start is not None:
+                regions.append((start, block.end))
+        return regions
+
+    def is_constant(self, instruction: Instruction) -> bool:
+        if instruction.opcode_type not in FOLDABLE:
+            return False
+        return all(
+            mode == ParameterMode.IMMEDIATE or mode == ParameterMode.POSITION and param not in self.written
+            for mode, param in zip(instruction.op.param_modes[:2], instruction.params[:2])
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Disassemble an intcode program')
+    parser.add_argument('filename')
+    parser.add_argument('--linear', action='store_true', help='decode the whole image instead of what is reachable')
+    parser.add_argument('--entry', type=int, action='append', help='entry point, 0 by default')
+    parser.add_argument('--cfg', action='store_true', help='show basic blocks and the analysis')
+    args = parser.parse_args()
+
+    disassembler = Disassembler(read_file(args.filename)[0])
+    entries = args.entry or [0]
+    if args.linear:
+        for item in disassembler.linear():
+            print(item if isinstance(item, Instruction) else f"{item:>6}: DATA            {disassembler[item]}")
+        return
+
+    code = disassembler.recursive(entries)
+    if not args.cfg:
+        for address in sorted(code):
+            print(code[address])
+        return
+
+    blocks = disassembler.cfg(entries)
+    for block in blocks.values():
+        print(block)
+        for instruction in block.instructions:
+            print(f"  {instruction}")
+    print(f"\n{len(blocks)} blocks, {len(code)} instructions, "
+          f"{sum(block.indirect for block in blocks.values())} with indirect exits")
+    for writer, target in disassembler.self_modifying_writes(code):
+        print(f"self-modifying write at {writer} to {target}")
+    for start, end in disassembler.foldable_regions(blocks):
+        print(f"constant-foldable region {start}-{end - 1}")
+
+
+if __name__ == '__main__':
+    main()
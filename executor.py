@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import gc
+import os
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from image_cache import Image, SharedImage
+from intcode import Engine, Program
+
+CHUNKSIZE = 16
+
+# Each worker process boots its own copy of the program once and forks it for every job
+worker_program: Optional[Program] = None
+
+
+def init_worker(image: SharedImage, engine: Engine):
+    global worker_program
+    worker_program = Program(image, engine)
+    worker_program.run()
+    Finalize(None, close_worker, args=(image,), exitpriority=10)
+
+
+def close_worker(image: SharedImage):
+    """Lets go of the shared block as the worker exits. Pages of the program and its forks are views of it,
+    and closures keep those programs in cycles, so they have to be collected before the block can close."""
+    global worker_program
+    worker_program = None
+    gc.collect()
+    image.close()
+
+
+def run_job(job: Tuple[int, Tuple[int, ...]]) -> Tuple[int, List[int]]:
+    index, inputs = job
+    program = worker_program.fork()
+    for val in inputs:
+        program.add_input_value(val)
+    program.run()
+    return index, list(program.outputs)
+
+
+class ProgramExecutor:
+    """Runs one intcode image against many independent input vectors on a pool of worker processes.
+    The parsed image is put in shared memory once, and each worker maps it rather than getting a copy,
+    so starting a worker costs the same however big the program is."""
+
+    def __init__(self, line: Union[str, List[int]], engine: Engine = Engine.THREADED,
+                 processes: Optional[int] = None, chunksize: int = CHUNKSIZE):
+        image = Image.parse(line) if isinstance(line, str) else line
+        self.image = SharedImage.create(image if isinstance(image, Image) else Image.from_values(image))
+        self.chunksize = chunksize
+        self.pool = Pool(processes or os.cpu_count(), initializer=init_worker, initargs=(self.image, engine))
+
+    def __enter__(self) -> ProgramExecutor:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.image.close()
+        self.image.unlink()
+
+    def map(self, inputs: Iterable[Iterable[int]]) -> Iterator[List[int]]:
+        """Outputs of each run, in the same order as the inputs"""
+        for _, outputs in self.pool.imap(run_job, self.jobs(inputs), self.chunksize):
+            yield outputs
+
+    def as_completed(self, inputs: Iterable[Iterable[int]]) -> Iterator[Tuple[int, List[int]]]:
+        """(index of the input vector, outputs) for each run, as soon as it finishes"""
+        return self.pool.imap_unordered(run_job, self.jobs(inputs), self.chunksize)
+
+    @staticmethod
+    def jobs(inputs: Iterable[Iterable[int]]) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        return ((index, tuple(vals)) for index, vals in enumerate(inputs))
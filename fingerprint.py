@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+from intcode import Program
+
+
+class StateHasher:
+    """Fingerprints a program's state: memory, pointer, relative base, status and both queues.
+    Memory is hashed incrementally. After each fingerprint the memory gives up ownership of its pages, so
+    the next write to a page copies it, which is the copy on write that forks already rely on. A page that
+    is still the very object we hashed last time can't have changed, so only the copies get hashed.
+    Pages of zeros hash as if they weren't there. Fingerprints are only meaningful while the program is stopped."""
+
+    def __init__(self, program: Program):
+        self.program = program
+        # The page objects we last hashed, held on to so their ids can't be reused
+        self.pages: Dict[int, List[int]] = {}
+        self.page_hashes: Dict[int, int] = {}
+        self.memory_hash = 0
+
+    def fingerprint(self) -> int:
+        memory = self.program.memory
+        for key in [key for key in self.pages if key not in memory.pages]:
+            self.update(key, None)
+        for key, page in memory.pages.items():
+            if self.pages.get(key) is not page:
+                self.update(key, page)
+        memory.writable.clear()
+        program = self.program
+        return hash((
+            self.memory_hash, program.ptr, program.relative_base, program.status,
+            tuple(program.input_handler.values), tuple(program.outputs)
+        ))
+
+    def update(self, key: int, page: Optional[List[int]]):
+        old = self.page_hashes.pop(key, None)
+        if old is not None:
+            self.memory_hash ^= hash((key, old))
+        self.pages.pop(key, None)
+        if page is None:
+            return
+        self.pages[key] = page
+        if any(page):
+            new = self.page_hashes[key] = hash(tuple(page))
+            self.memory_hash ^= hash((key, new))
+
+
+class CycleDetector:
+    """Remembers the combined fingerprint of a set of programs at each tick of a driver,
+    so it can tell when they are all back in a state they have been in before"""
+
+    def __init__(self, programs: Iterable[Program]):
+        self.hashers = [StateHasher(program) for program in programs]
+        self.seen: Dict[int, int] = {}
+
+    def fingerprint(self) -> int:
+        return hash(tuple(hasher.fingerprint() for hasher in self.hashers))
+
+    def visit(self, tick: int) -> Optional[int]:
+        """The tick at which the current state was first seen, or None if it is new"""
+        fingerprint = self.fingerprint()
+        first = self.seen.get(fingerprint)
+        if first is None:
+            self.seen[fingerprint] = tick
+        return first
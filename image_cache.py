@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+CACHE_DIR = os.environ.get('INTCODE_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+MAGIC = b'ICIM'
+VERSION = 1
+# magic, version, number of words, number of escapes; 24 bytes, so the words that follow are 8-byte aligned
+HEADER = struct.Struct('=4sIQQ')
+ESCAPE = struct.Struct('=QI')
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class Image:
+    """A parsed intcode image. Words are int64, usually a view onto a memory-mapped cache file;
+    anything too big for 64 bits is kept in `escapes` by address, with a 0 in its word.
+    Slicing gives a list, so an image can stand in for the list of ints a Program is built from."""
+
+    def __init__(self, words: Union[memoryview, array], escapes: Dict[int, int], digest: str,
+                 buffer: Optional[mmap.mmap] = None):
+        self.words = words
+        self.escapes = escapes
+        self.digest = digest
+        self.buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, List[int]]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            vals = self.words[index].tolist()
+            for address, val in self.escapes.items():
+                if start <= address < stop and (address - start) % step == 0:
+                    vals[(address - start) // step] = val
+            return vals
+        val = self.escapes.get(index)
+        return self.words[index] if val is None else val
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.tolist())
+
+    def __reduce__(self):
+        # Worker processes get a plain list rather than a handle on our mapping
+        return list, (self.tolist(),)
+
+    def tolist(self) -> List[int]:
+        return self[:]
+
+    @classmethod
+    def parse(cls, line: str) -> Image:
+        return cls.from_values([int(ele) for ele in line.split(',')], digest(line))
+
+    @classmethod
+    def from_values(cls, vals: Sequence[int], key: Optional[str] = None) -> Image:
+        escapes = {address: val for address, val in enumerate(vals) if not INT64_MIN <= val <= INT64_MAX}
+        words = array('q', (0 if address in escapes else val for address, val in enumerate(vals)))
+        return cls(words, escapes, key or image_digest(vals))
+
+    def to_bytes(self) -> bytes:
+        escapes = b''.join(
+            ESCAPE.pack(address, len(raw)) + raw
+            for address, raw in ((address, to_bytes(val)) for address, val in sorted(self.escapes.items()))
+        )
+        return HEADER.pack(MAGIC, VERSION, len(self.words), len(self.escapes)) + self.words.tobytes() + escapes
+
+    @classmethod
+    def from_buffer(cls, buffer: mmap.mmap, digest: str) -> Image:
+        magic, version, num_words, num_escapes = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an intcode image cache file (version {VERSION})")
+        end = HEADER.size + 8 * num_words
+        if end > len(buffer):
+            raise ValueError("Intcode image cache file is truncated")
+        escapes, offset = {}, end
+        for _ in range(num_escapes):
+            if offset + ESCAPE.size > len(buffer):
+                raise ValueError("Intcode image cache file is truncated")
+            address, length = ESCAPE.unpack_from(buffer, offset)
+            offset += ESCAPE.size
+            if offset + length > len(buffer):
+                raise ValueError("Intcode image cache file is truncated")
+            escapes[address] = int.from_bytes(buffer[offset:offset + length], 'little', signed=True)
+            offset += length
+        # The words are only mapped once the file checks out, so a bad file can still be closed
+        words = memoryview(buffer)[HEADER.size:end].cast('q')
+        return cls(words, escapes, digest, buffer)
+
+
+class SharedImage(Image):
+    """An image whose words live in a multiprocessing.shared_memory block. It pickles as the name of the block,
+    so a process it is sent to maps the same words instead of receiving a copy, however big the program is.
+    The process that created it should unlink it once every user is done."""
+
+    def __init__(self, shm: SharedMemory, length: int, escapes: Dict[int, int], digest: str):
+        super().__init__(shm.buf[:8 * length].cast('q'), escapes, digest)
+        self.shm = shm
+
+    def __reduce__(self):
+        return SharedImage.attach, (self.shm.name, len(self), self.escapes, self.digest)
+
+    @classmethod
+    def create(cls, image: Image) -> SharedImage:
+        shm = SharedMemory(create=True, size=max(8 * len(image), 1))
+        shm.buf[:8 * len(image)] = memoryview(image.words).cast('B')
+        return cls(shm, len(image), image.escapes, image.digest)
+
+    @classmethod
+    def attach(cls, name: str, length: int, escapes: Dict[int, int], digest: str) -> SharedImage:
+        return cls(SharedMemory(name=name), length, escapes, digest)
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class ImageCache:
+    """Parses each distinct intcode program once. The parsed image is written to a file named by the hash of
+    the program text and later loads memory-map that file, so they cost a hash rather than a parse."""
+
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+        self.images: Dict[str, Image] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def load(self, line: str) -> Image:
+        key = digest(line)
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = self.read(key) or self.write(Image.parse(line))
+        return image
+
+    def load_file(self, filename: str) -> Image:
+        with open(filename, 'r') as f:
+            return self.load(f.readline().rstrip('\n'))
+
+    def read(self, key: str) -> Optional[Image]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            return Image.from_buffer(buffer, key)
+        except (ValueError, TypeError, struct.error):
+            # load parses the program again and writes over the bad file
+            buffer.close()
+            return None
+
+    def write(self, image: Image) -> Image:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{self.path(image.digest)}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(image.to_bytes())
+        os.replace(tmp, self.path(image.digest))
+        return image
+
+
+def digest(line: str) -> str:
+    return hashlib.sha256(line.strip().encode()).hexdigest()
+
+
+def image_digest(image: Sequence[int]) -> str:
+    """The digest of the program text an image was parsed from"""
+    return image.digest if isinstance(image, Image) else digest(','.join(str(val) for val in image))
+
+
+def to_bytes(val: int) -> bytes:
+    return val.to_bytes((val.bit_length() + 8) // 8, 'little', signed=True)
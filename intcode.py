@@ -1,8 +1,27 @@
 from __future__ import annotations
-from collections import deque
+from collections import Counter, deque
 
-from typing import List
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
 from enum import Enum, auto
+from array import array
+import json
+import mmap
+import os
+import struct
+import time
+
+from image_cache import INT64_MAX, INT64_MIN, Image
+
+MAX_INSTRUCTION_LENGTH = 4
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+ZERO_PAGE = (0,) * PAGE_SIZE
+NO_LIMIT = float('inf')
+CHECKPOINT_MAGIC = b'ICVM'
+CHECKPOINT_VERSION = 1
+# magic, version, number of pages, size of the image; 24 bytes, so the page words that follow are 8-byte aligned
+CHECKPOINT_HEADER = struct.Struct('=4sIQQ')
 
 
 class ParameterMode(int, Enum):
@@ -13,8 +32,8 @@ class ParameterMode(int, Enum):
     @classmethod
     def get_mode(cls, mode: int) -> ParameterMode:
         try:
-            return next(m for m in cls if m.value == mode)
-        except StopIteration:
+            return cls(mode)
+        except ValueError:
             raise ValueError(f"Invalid mode: {mode}")
 
 
@@ -44,12 +63,15 @@ class OpcodeType(int, Enum):
     @classmethod
     def get_opcode_type(cls, opcode_type: int) -> OpcodeType:
         try:
-            return next(o for o in cls if o.value == opcode_type)
-        except StopIteration:
+            return cls(opcode_type)
+        except ValueError:
             raise ValueError(f"Invalid Opcode Type: {opcode_type}")
 
 
 class Operator:
+    # Decoded operators keyed by the raw opcode word; operators are never mutated so they can be shared
+    cache: Dict[int, Operator] = {}
+
     def __init__(self, opcode_type: OpcodeType, param_modes: List[ParameterMode]):
         self.opcode_type = opcode_type
         self.param_modes = param_modes
@@ -60,37 +82,353 @@ class Operator:
 
     @classmethod
     def get_operator(cls, opcode: int) -> Operator:
-        opcode_str = str(opcode).zfill(5)
-        opcode_type = OpcodeType.get_opcode_type(int(opcode_str[-2:]))
+        op = cls.cache.get(opcode)
+        if op is None:
+            op = cls.cache[opcode] = cls.decode(opcode)
+        return op
+
+    @classmethod
+    def decode(cls, opcode: int) -> Operator:
+        if opcode < 0:
+            raise ValueError(f"Invalid Opcode Type: {opcode}")
+        opcode_type = OpcodeType.get_opcode_type(opcode % 100)
         return cls(
             opcode_type,
-            cls.get_parameter_modes(reversed(opcode_str[:3]))[:opcode_type.num_params]
+            [ParameterMode.get_mode(opcode // 10 ** (i + 2) % 10) for i in range(opcode_type.num_params)]
         )
 
 
+Page = Union[array, List[int]]
+
+
+class Memory:
+    """Sparse memory made of fixed size pages. A page is only allocated when it is first written to
+    and reading from a page that was never written returns 0. Copies share pages until they write to them,
+    so every write goes through `writable`, which only holds the pages this memory owns.
+    Pages are array('q'), which holds words unboxed. A page that has to hold a value too big for 64 bits
+    is turned into a list for good, so reads never need to know which kind of page they are looking at.
+    An image with its int64 words in a buffer, like an image_cache.Image, is mapped rather than copied:
+    its pages are read-only views of the buffer, and a page is only copied once it is written to."""
+
+    def __init__(self, image: Sequence[int]):
+        self.pages: Dict[int, Page] = {}
+        self.writable: Dict[int, Page] = {}
+        if getattr(image, 'words', None) is not None:
+            self.map(memoryview(image.words), image.escapes)
+            return
+        for start in range(0, len(image), PAGE_SIZE):
+            page = list(image[start:start + PAGE_SIZE])
+            page += [0] * (PAGE_SIZE - len(page))
+            try:
+                self.pages[start >> PAGE_BITS] = array('q', page)
+            except OverflowError:
+                self.pages[start >> PAGE_BITS] = page
+        self.writable.update(self.pages)
+
+    def __getitem__(self, address: int) -> int:
+        return (self.pages.get(address >> PAGE_BITS) or self.unwritten(address))[address & PAGE_MASK]
+
+    def __setitem__(self, address: int, value: int):
+        try:
+            (self.writable.get(address >> PAGE_BITS) or self.allocate(address))[address & PAGE_MASK] = value
+        except OverflowError:
+            self.promote(address, value)
+
+    def map(self, words: memoryview, escapes: Dict[int, int]):
+        for start in range(0, len(words), PAGE_SIZE):
+            page = words[start:start + PAGE_SIZE]
+            if len(page) < PAGE_SIZE:
+                # The last page has to be padded with zeros, so it gets a copy of its own
+                page, tail = array('q'), page
+                page.frombytes(tail.cast('B'))
+                page.extend(ZERO_PAGE[len(tail):])
+                self.writable[start >> PAGE_BITS] = page
+            self.pages[start >> PAGE_BITS] = page
+        for address, value in escapes.items():
+            self.promote(address, value)
+
+    def map_pages(self, keys: Sequence[int], words: memoryview, escapes: Dict[int, int]):
+        """Maps pages saved back to back by to_bytes, the way map does an image"""
+        for i, key in enumerate(keys):
+            self.pages[key] = words[i * PAGE_SIZE:(i + 1) * PAGE_SIZE]
+        for address, value in escapes.items():
+            self.promote(address, value)
+
+    @staticmethod
+    def unwritten(address: int) -> Sequence[int]:
+        """The page to read from at an address whose page was never written"""
+        if address < 0:
+            raise IndexError(f"Invalid address: {address}")
+        return ZERO_PAGE
+
+    def allocate(self, address: int) -> Page:
+        if address < 0:
+            raise IndexError(f"Invalid address: {address}")
+        page_num = address >> PAGE_BITS
+        page = self.pages.get(page_num)
+        if page is None:
+            page = array('q', ZERO_PAGE)
+        elif isinstance(page, memoryview):
+            page, view = array('q'), page
+            page.frombytes(view.cast('B'))
+        else:
+            page = page[:]
+        self.pages[page_num] = self.writable[page_num] = page
+        return page
+
+    def promote(self, address: int, value: int):
+        """Stores a value that doesn't fit in a word, by turning its page into a list"""
+        page_num = address >> PAGE_BITS
+        page = self.writable.get(page_num) or self.allocate(address)
+        if not isinstance(page, list):
+            page = self.pages[page_num] = self.writable[page_num] = page.tolist()
+        page[address & PAGE_MASK] = value
+
+    def copy(self) -> Memory:
+        memory = Memory([])
+        memory.pages.update(self.pages)
+        self.writable.clear()
+        return memory
+
+    def to_bytes(self) -> Tuple[List[int], bytes, Dict[int, int]]:
+        """The numbers of the pages that aren't all zeros, their words back to back,
+        and the values too big for a word by address, with a 0 in their word"""
+        keys, words, escapes = [], array('q'), {}
+        for key, page in sorted(self.pages.items()):
+            if not any(page):
+                continue
+            keys.append(key)
+            if isinstance(page, list):
+                start = key << PAGE_BITS
+                escapes.update(
+                    (start + offset, val) for offset, val in enumerate(page) if not INT64_MIN <= val <= INT64_MAX
+                )
+                page = [0 if start + offset in escapes else val for offset, val in enumerate(page)]
+            words.extend(page)
+        return keys, words.tobytes(), escapes
+
+    def get_range(self, start: int, stop: int) -> List[int]:
+        return [self[address] for address in range(start, stop)]
+
+    @staticmethod
+    def read_source(address: Union[int, str], name: str = 'a') -> str:
+        """Inlined read for generated code that binds `mem` and `pages` to the memory and its pages.
+        An address expression that isn't a plain name is evaluated once into `name`."""
+        if isinstance(address, int):
+            return f"(pages.get({address >> PAGE_BITS}) or mem.unwritten({address}))[{address & PAGE_MASK}]"
+        if address.isidentifier():
+            return f"(pages.get({address} >> {PAGE_BITS}) or mem.unwritten({address}))[{address} & {PAGE_MASK}]"
+        return f"(pages.get(({name} := {address}) >> {PAGE_BITS}) or mem.unwritten({name}))[{name} & {PAGE_MASK}]"
+
+    @staticmethod
+    def write_source(name: str, value: str) -> str:
+        """Inlined write of value to the address held in `name`, for code that binds `mem` and `writable`.
+        The try costs nothing until a value overflows its word."""
+        return f"v = {value}\n" \
+            f"try:\n" \
+            f"    (writable.get({name} >> {PAGE_BITS}) or mem.allocate({name}))[{name} & {PAGE_MASK}] = v\n" \
+            f"except OverflowError:\n" \
+            f"    mem.promote({name}, v)"
+
+
+class ClosureCompiler:
+    """Builds a factory per opcode word whose closures execute one instruction with its parameters baked in.
+    A closure returns the address of the next instruction, or None once the program has to stop."""
+    WRITES = {
+        ParameterMode.POSITION: 'p{i}{n}',
+        ParameterMode.IMMEDIATE: 'addr{n} + {i} + 1',
+        ParameterMode.RELATIVE: 'self.relative_base + p{i}{n}'
+    }
+    WRITE = 'c = {address}\n' + Memory.write_source('c', '{value}') + \
+            '\nif c in code_addresses:\n    self.invalidate(c)\n    return nxt{n}\n'
+    STOP = 'self.ptr, self.status = addr{n}, Status.{status}\nreturn None\n'
+    NEXT = 'return nxt{n}\n'
+    FACTORY = '''
+def factory(self, addr, p0=None, p1=None, p2=None):
+    mem, code_addresses, nxt = self.memory, self.code_addresses, addr + {length}
+    pages, writable = mem.pages, mem.writable
+    handler, outputs = self.input_handler, self.outputs
+
+    def op():
+{body}
+    return op
+'''
+
+    factories: Dict[int, Callable] = {}
+
+    @classmethod
+    def get_factory(cls, opcode: int) -> Callable:
+        factory = cls.factories.get(opcode)
+        if factory is None:
+            factory = cls.factories[opcode] = cls.build_factory(Operator.get_operator(opcode))
+        return factory
+
+    @classmethod
+    def build_factory(cls, op: Operator) -> Callable:
+        namespace = {'Status': Status}
+        exec(cls.FACTORY.format(length=op.opcode_type.num_params + 1, body=cls.indent(cls.body(op), 8)), namespace)
+        return namespace['factory']
+
+    @classmethod
+    def body(cls, op: Operator, n: str = '') -> str:
+        """Source for one instruction. Its address, parameters and next address are named addr, p0.. and nxt,
+        each followed by the suffix n, so the bodies of several instructions can share one closure."""
+        r = [cls.read(mode, i, n) for i, mode in enumerate(op.param_modes)]
+        w = [cls.WRITES[mode].format(i=i, n=n) for i, mode in enumerate(op.param_modes)]
+        nxt = cls.NEXT.format(n=n)
+
+        def write(address: str, value: str) -> str:
+            return cls.WRITE.format(address=address, value=value, n=n)
+
+        def stop(status: Status) -> str:
+            return cls.STOP.format(status=status.name, n=n)
+
+        bodies = {
+            OpcodeType.ADD: lambda: write(w[2], f"{r[0]} + {r[1]}") + nxt,
+            OpcodeType.MULTIPLY: lambda: write(w[2], f"{r[0]} * {r[1]}") + nxt,
+            OpcodeType.INPUT: lambda: 'if not handler.values and not handler.pull():\n' +
+                                      cls.indent(stop(Status.WAITING_FOR_INPUT)) +
+                                      write(w[0], 'handler.get_input()') + nxt,
+            OpcodeType.OUTPUT: lambda: f"outputs.append({r[0]})\n" + nxt,
+            OpcodeType.JUMP_IF_TRUE: lambda: f"return {r[1]} if {r[0]} != 0 else nxt{n}\n",
+            OpcodeType.JUMP_IF_FALSE: lambda: f"return {r[1]} if {r[0]} == 0 else nxt{n}\n",
+            OpcodeType.LESS_THAN: lambda: write(w[2], f"1 if {r[0]} < {r[1]} else 0") + nxt,
+            OpcodeType.EQUALS: lambda: write(w[2], f"1 if {r[0]} == {r[1]} else 0") + nxt,
+            OpcodeType.ADJUST_RELATIVE: lambda: f"self.relative_base += {r[0]}\n" + nxt,
+            OpcodeType.TERMINATE: lambda: stop(Status.TERMINATED)
+        }
+        return bodies[op.opcode_type]()
+
+    @staticmethod
+    def read(mode: ParameterMode, num_param: int, n: str = '') -> str:
+        return Memory.read_source(f'p{num_param}{n}') if mode == ParameterMode.POSITION else \
+            f'p{num_param}{n}' if mode == ParameterMode.IMMEDIATE else \
+            Memory.read_source(f'self.relative_base + p{num_param}{n}', f'a{num_param}{n}')
+
+    @staticmethod
+    def indent(source: str, spaces: int = 4) -> str:
+        return ''.join(' ' * spaces + line + '\n' for line in source.splitlines())
+
+
 class InputHandler:
-    def __init__(self):
+    """Queues input values. An optional provider is asked for the next value only once the queue is empty,
+    so the queue check stays the only cost on the normal path. A provider that returns None has nothing
+    to give yet, and the program waits for input as usual."""
+    def __init__(self, provider: Optional[Callable[[], Optional[int]]] = None):
         self.values = deque()
+        self.provider = provider
 
     def add_input(self, val: int):
         self.values.append(val)
 
+    def add_inputs(self, vals: Iterable[int]):
+        self.values.extend(vals)
+
     def get_input(self) -> int:
         return self.values.popleft()
 
+    def pull(self) -> bool:
+        if self.provider is None:
+            return False
+        val = self.provider()
+        if val is None:
+            return False
+        self.values.append(val)
+        return True
+
+
+class OutputSink(deque):
+    """An output queue that hands each value straight to a callback rather than keeping it"""
+    def __init__(self, callback: Callable[[int], None]):
+        super().__init__()
+        self.callback = callback
+
+    def append(self, val: int):
+        self.callback(val)
+
+    def extend(self, vals: Iterable[int]):
+        for val in vals:
+            self.callback(val)
+
 
 class Status(str, Enum):
     WAITING_FOR_INPUT = auto()
     TERMINATED = auto()
     PROCESSING = auto()
+    YIELDED = auto()
+    PAUSED = auto()
 
 
-class Program:
-    LARGE = 10_000
+class Stats:
+    """Counters collected by a program once Program.enable_stats has been called"""
+    def __init__(self):
+        self.opcodes = Counter()
+        self.addresses = Counter()
+        self.instructions = 0
+        self.outputs = 0
+        self.run_time = 0.0
+        self.blocked_time = 0.0
+        self.blocked_since: Optional[float] = None
 
-    def __init__(self, line: str):
-        self.initial_memory = [int(ele) for ele in line.split(',')]
-        self.memory: List[int] = []
+    @property
+    def instructions_per_second(self) -> float:
+        return self.instructions / self.run_time if self.run_time else 0.0
+
+    def hot_addresses(self, n: int = 10) -> List[Tuple[int, int]]:
+        return self.addresses.most_common(n)
+
+    def record(self, opcode_type: OpcodeType, ptr: int):
+        self.instructions += 1
+        self.opcodes[opcode_type.name] += 1
+        self.addresses[ptr] += 1
+        if opcode_type == OpcodeType.OUTPUT:
+            self.outputs += 1
+
+    def as_dict(self) -> Dict:
+        return {
+            'instructions': self.instructions,
+            'instructions_per_second': self.instructions_per_second,
+            'run_time': self.run_time,
+            'blocked_time': self.blocked_time,
+            'outputs': self.outputs,
+            'opcodes': dict(self.opcodes),
+            'addresses': {str(address): count for address, count in sorted(self.addresses.items())}
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+
+class Snapshot(NamedTuple):
+    memory: Memory
+    ptr: int
+    relative_base: int
+    status: Status
+    inputs: Tuple[int, ...]
+    outputs: Tuple[int, ...]
+
+
+class Engine(str, Enum):
+    INTERPRETER = auto()
+    THREADED = auto()
+
+
+class Program:
+    """An intcode computer. Input is queued with add_input_value or feed, or pulled from input_provider
+    whenever the queue runs dry; output is queued for get_output_value or drain, or pushed to output_sink.
+    Forks get plain queues rather than the callbacks."""
+    def __init__(self, line: Union[str, Sequence[int]], engine: Engine = Engine.INTERPRETER,
+                 input_provider: Optional[Callable[[], Optional[int]]] = None,
+                 output_sink: Optional[Callable[[int], None]] = None):
+        self.initial_memory = [int(ele) for ele in line.split(',')] if isinstance(line, str) else line
+        self.memory = Memory([])
+        self.instructions: Dict[int, Tuple[Operator, Tuple[int, ...]]] = {}
+        self.code_addresses: Set[int] = set()
+        self.threaded: Dict[int, Callable[[], Optional[int]]] = {}
         self.ptr: int = 0
         self.status = Status.WAITING_FOR_INPUT
         self.relative_base = 0
@@ -107,32 +445,278 @@ class Program:
             OpcodeType.EQUALS: self._equals,
             OpcodeType.ADJUST_RELATIVE: self._adjust_relative
         }
-        self.input_handler = InputHandler()
-        self.outputs = deque()
+        self.engine = engine
+        self.engines = {
+            Engine.INTERPRETER: self._run_interpreted,
+            Engine.THREADED: self._run_threaded
+        }
+        self.limited_engines = {
+            Engine.INTERPRETER: self._run_interpreted_for,
+            Engine.THREADED: self._run_threaded_for
+        }
+        self.stats: Optional[Stats] = None
+        self.input_handler = InputHandler(input_provider)
+        self.outputs = deque() if output_sink is None else OutputSink(output_sink)
+
+    @classmethod
+    def from_image(cls, image: Sequence[int], engine: Optional[Engine] = None, **kwargs) -> Program:
+        """A program over an image that is already parsed, such as an image_cache.Image, without reparsing it.
+        Without an engine, it runs on the default engine of its class."""
+        return cls(image, **kwargs) if engine is None else cls(image, engine, **kwargs)
 
     def reset(self):
-        self.memory = self.initial_memory.copy() + [0] * self.LARGE
-        self.ptr = 0
+        self.set_memory(Memory(self.initial_memory))
+        self.ptr, self.status = 0, Status.WAITING_FOR_INPUT
+
+    def set_memory(self, memory: Memory):
+        self.memory = memory
+        self.instructions, self.code_addresses, self.threaded = {}, set(), {}
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(
+            self.memory.copy(), self.ptr, self.relative_base, self.status,
+            tuple(self.input_handler.values), tuple(self.outputs)
+        )
+
+    def restore(self, snapshot: Snapshot):
+        self.set_memory(snapshot.memory.copy())
+        self.ptr, self.relative_base, self.status = snapshot.ptr, snapshot.relative_base, snapshot.status
+        self.input_handler.values.clear()
+        self.input_handler.values.extend(snapshot.inputs)
+        self.outputs.clear()
+        self.outputs.extend(snapshot.outputs)
+
+    def fork(self) -> Program:
+        """An independent copy of this program that shares memory pages with it until either side writes.
+        The copy is built over an empty image, so it doesn't pay for laying out memory it then replaces."""
+        program = type(self)([], self.engine)
+        program.initial_memory = self.initial_memory
+        program.set_memory(self.memory.copy())
+        program.ptr, program.relative_base, program.status = self.ptr, self.relative_base, self.status
+        program.input_handler.values.extend(self.input_handler.values)
+        program.outputs.extend(self.outputs)
+        program.inherit_code(self)
+        return program
+
+    def inherit_code(self, other: Program):
+        """Reuse the decoded instructions of a program whose memory is identical to ours"""
+        self.instructions, self.code_addresses = other.instructions.copy(), other.code_addresses.copy()
+
+    def save(self, path: str):
+        """Writes a stopped program to path: the header, then the pages of memory as int64 words, then its image
+        so it can still be reset, then the rest of its state as JSON. Callbacks aren't saved."""
+        keys, words, escapes = self.memory.to_bytes()
+        image = self.initial_memory if isinstance(self.initial_memory, Image) else \
+            Image.from_values(self.initial_memory)
+        image_bytes = image.to_bytes()
+        state = {
+            'digest': image.digest, 'ptr': self.ptr, 'relative_base': self.relative_base, 'status': self.status.name,
+            'inputs': list(self.input_handler.values), 'outputs': list(self.outputs),
+            'pages': keys, 'escapes': {str(address): val for address, val in escapes.items()}
+        }
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(keys), len(image_bytes)))
+            f.write(words)
+            f.write(image_bytes)
+            f.write(json.dumps(state, separators=(',', ':')).encode())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, engine: Optional[Engine] = None, **kwargs) -> Program:
+        """A program in the state saved to path, on the default engine of its class unless given one.
+        The file is memory-mapped, so its pages and image are read-only views of it that only get copied
+        once they are written to. The mapping is kept as the buffer of the program's initial_memory."""
+        with open(path, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise ValueError(f"Not an intcode checkpoint file (version {CHECKPOINT_VERSION})") from e
+        # Everything is checked before the pages are mapped, as the file can't be closed while they are
+        try:
+            magic, version, num_pages, image_size = CHECKPOINT_HEADER.unpack_from(buffer)
+            if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+                raise ValueError("Wrong magic number or version")
+            pages_end = CHECKPOINT_HEADER.size + 8 * PAGE_SIZE * num_pages
+            image_end = pages_end + image_size
+            if image_end > len(buffer):
+                raise ValueError("The file is truncated")
+            state = json.loads(buffer[image_end:])
+            keys = state['pages']
+            if len(keys) != num_pages:
+                raise ValueError("The page count doesn't match the header")
+            escapes = {int(address): val for address, val in state['escapes'].items()}
+            status = Status[state['status']]
+            region = memoryview(buffer)[pages_end:image_end]
+            try:
+                image = Image.from_buffer(region, state['digest'])
+            finally:
+                region.release()
+        except (ValueError, KeyError, TypeError, AttributeError, struct.error) as e:
+            buffer.close()
+            raise ValueError(f"Not an intcode checkpoint file (version {CHECKPOINT_VERSION})") from e
+
+        image.buffer = buffer
+        program = cls.from_image(image, engine, **kwargs)
+        memory = Memory([])
+        memory.map_pages(keys, memoryview(buffer)[CHECKPOINT_HEADER.size:pages_end].cast('q'), escapes)
+        program.set_memory(memory)
+        program.ptr, program.relative_base, program.status = state['ptr'], state['relative_base'], status
+        program.feed(state['inputs'])
+        program.outputs.extend(state['outputs'])
+        return program
 
     def add_input_value(self, val: int):
         self.input_handler.add_input(val)
 
+    def feed(self, vals: Iterable[int]):
+        self.input_handler.add_inputs(vals)
+
+    def feed_bytes(self, b: bytes):
+        self.input_handler.add_inputs(b)
+
     def get_output_value(self) -> int:
         return self.outputs.popleft()
 
-    def run(self):
-        op = Operator.get_operator(self.memory[self.ptr])
+    def drain(self, count: Optional[int] = None, as_array: bool = False) -> Union[List[int], array]:
+        """Removes and returns the oldest count outputs, or all of them.
+        Returned as an array('q') if asked, in which case every value has to fit in 64 bits."""
+        if count is None or count >= len(self.outputs):
+            vals = list(self.outputs)
+            self.outputs.clear()
+        else:
+            vals = [self.outputs.popleft() for _ in range(count)]
+        return array('q', vals) if as_array else vals
+
+    def run(self, max_steps: Optional[int] = None, until_outputs: Optional[int] = None):
+        """Runs until the program needs input or terminates. It yields early once max_steps instructions
+        have executed or once this call has queued until_outputs values, so until_outputs can't be used
+        when output goes to output_sink. A program that has terminated is left as it is."""
+        if until_outputs is not None and isinstance(self.outputs, OutputSink):
+            raise ValueError("until_outputs needs outputs to be queued rather than handed to output_sink")
+        if self.status == Status.TERMINATED:
+            return
+        if max_steps is None and until_outputs is None:
+            self.engines[self.engine]()
+        else:
+            self.limited_engines[self.engine](
+                NO_LIMIT if max_steps is None else max_steps,
+                NO_LIMIT if until_outputs is None else len(self.outputs) + until_outputs
+            )
+
+    def _run_interpreted(self):
+        op, params = self.fetch()
         self.update_status(op)
         while self.status not in [Status.WAITING_FOR_INPUT, Status.TERMINATED]:
             self.ptr += 1
-            positions = [self._get_parameter_pos(op, i) for i in range(op.opcode_type.num_params)]
+            positions = [self._get_parameter_pos(op, params, i) for i in range(op.opcode_type.num_params)]
             self.execute_operation(op.opcode_type, positions)
 
-            op = Operator.get_operator(self.memory[self.ptr])
+            op, params = self.fetch()
             self.update_status(op)
 
+    def fetch(self) -> Tuple[Operator, Tuple[int, ...]]:
+        return self.fetch_at(self.ptr)
+
+    def fetch_at(self, ptr: int) -> Tuple[Operator, Tuple[int, ...]]:
+        """Decoded instructions are cached by address until something writes over them"""
+        instruction = self.instructions.get(ptr)
+        if instruction is None:
+            op = Operator.get_operator(self.memory[ptr])
+            end = ptr + 1 + op.opcode_type.num_params
+            instruction = self.instructions[ptr] = op, tuple(self.memory.get_range(ptr + 1, end))
+            self.code_addresses.update(range(ptr, end))
+        return instruction
+
+    def step(self):
+        op, params = self.fetch()
+        self.update_status(op)
+        if self.status == Status.PROCESSING:
+            self.ptr += 1
+            positions = [self._get_parameter_pos(op, params, i) for i in range(op.opcode_type.num_params)]
+            self.execute_operation(op.opcode_type, positions)
+
+    def enable_stats(self) -> Stats:
+        """Switches every engine over to an instrumented interpreter loop, leaving the normal loops untouched.
+        Time blocked on input is the time between a run stopping for input and the next call to run."""
+        self.stats = Stats()
+        self.engines = dict.fromkeys(self.engines, self._run_instrumented)
+        self.limited_engines = dict.fromkeys(self.limited_engines, self._run_instrumented)
+        return self.stats
+
+    def _run_instrumented(self, max_steps: float = NO_LIMIT, until_outputs: float = NO_LIMIT):
+        stats, start = self.stats, time.perf_counter()
+        if stats.blocked_since is not None:
+            stats.blocked_time += start - stats.blocked_since
+            stats.blocked_since = None
+        steps = 0
+        while steps < max_steps and len(self.outputs) < until_outputs:
+            ptr = self.ptr
+            op, _ = self.fetch()
+            self.step()
+            # An input that blocked runs again once it is fed, so it is counted then
+            if self.status != Status.WAITING_FOR_INPUT:
+                stats.record(op.opcode_type, ptr)
+            if self.status != Status.PROCESSING:
+                break
+            steps += 1
+        else:
+            self.status = Status.YIELDED
+        end = time.perf_counter()
+        stats.run_time += end - start
+        if self.status == Status.WAITING_FOR_INPUT:
+            stats.blocked_since = end
+
+    def _run_interpreted_for(self, max_steps: float, until_outputs: float):
+        steps = 0
+        while steps < max_steps and len(self.outputs) < until_outputs:
+            self.step()
+            if self.status != Status.PROCESSING:
+                return
+            steps += 1
+        self.status = Status.YIELDED
+
+    def _run_threaded(self):
+        threaded, ptr = self.threaded, self.ptr
+        self.status = Status.PROCESSING
+        while ptr is not None:
+            op = threaded.get(ptr)
+            if op is None:
+                op = self.translate(ptr)
+            ptr = op()
+
+    def _run_threaded_for(self, max_steps: float, until_outputs: float):
+        threaded, ptr, outputs, steps = self.threaded, self.ptr, self.outputs, 0
+        self.status = Status.PROCESSING
+        while steps < max_steps and len(outputs) < until_outputs:
+            if ptr is None:
+                return
+            op = threaded.get(ptr)
+            if op is None:
+                op = self.translate(ptr)
+            ptr = op()
+            steps += 1
+        if ptr is not None:
+            self.ptr, self.status = ptr, Status.YIELDED
+
+    def translate(self, ptr: int) -> Callable[[], Optional[int]]:
+        _, params = self.fetch_at(ptr)
+        op = self.threaded[ptr] = ClosureCompiler.get_factory(self.memory[ptr])(self, ptr, *params)
+        return op
+
+    def write(self, pos: int, val: int):
+        self.memory[pos] = val
+        if pos in self.code_addresses:
+            self.invalidate(pos)
+
+    def invalidate(self, pos: int):
+        for start in range(pos - MAX_INSTRUCTION_LENGTH + 1, pos + 1):
+            self.instructions.pop(start, None)
+            self.threaded.pop(start, None)
+        self.code_addresses.discard(pos)
+
     def update_status(self, op: Operator):
-        if op.opcode_type == OpcodeType.INPUT and not self.input_handler.values:
+        if op.opcode_type == OpcodeType.INPUT and not self.input_handler.values and not self.input_handler.pull():
             self.status = Status.WAITING_FOR_INPUT
         elif op.opcode_type == OpcodeType.TERMINATE:
             self.status = Status.TERMINATED
@@ -142,21 +726,21 @@ class Program:
     def execute_operation(self, opcode_type: OpcodeType, positions: List[int]):
         self.execution_methods[opcode_type](opcode_type, positions)
 
-    def _get_parameter_pos(self, op: Operator, num_param: int) -> int:
+    def _get_parameter_pos(self, op: Operator, params: Tuple[int, ...], num_param: int) -> int:
         return self.ptr + num_param if op.param_modes[num_param] == ParameterMode.IMMEDIATE else \
-            self.memory[self.ptr + num_param] if op.param_modes[num_param] == ParameterMode.POSITION else \
-            self.relative_base + self.memory[self.ptr + num_param]
+            params[num_param] if op.param_modes[num_param] == ParameterMode.POSITION else \
+            self.relative_base + params[num_param]
 
     def _add(self, opcode_type: OpcodeType, positions: List[int]):
-        self.memory[positions[2]] = self.memory[positions[0]] + self.memory[positions[1]]
+        self.write(positions[2], self.memory[positions[0]] + self.memory[positions[1]])
         self.ptr += opcode_type.num_params
 
     def _multiply(self, opcode_type: OpcodeType, positions: List[int]):
-        self.memory[positions[2]] = self.memory[positions[0]] * self.memory[positions[1]]
+        self.write(positions[2], self.memory[positions[0]] * self.memory[positions[1]])
         self.ptr += opcode_type.num_params
 
     def _input(self, opcode_type: OpcodeType, positions: List[int]):
-        self.memory[positions[0]] = self.input_handler.get_input()
+        self.write(positions[0], self.input_handler.get_input())
         self.ptr += opcode_type.num_params
 
     def _output(self, opcode_type: OpcodeType, positions: List[int]):
@@ -174,15 +758,11 @@ class Program:
             self.ptr + opcode_type.num_params
 
     def _less_than(self, opcode_type: OpcodeType, positions: List[int]):
-        self.memory[positions[2]] = 1 if \
-            self.memory[positions[0]] < self.memory[positions[1]] else \
-            0
+        self.write(positions[2], 1 if self.memory[positions[0]] < self.memory[positions[1]] else 0)
         self.ptr += opcode_type.num_params
 
     def _equals(self, opcode_type: OpcodeType, positions: List[int]):
-        self.memory[positions[2]] = 1 if \
-            self.memory[positions[0]] == self.memory[positions[1]] else \
-            0
+        self.write(positions[2], 1 if self.memory[positions[0]] == self.memory[positions[1]] else 0)
         self.ptr += opcode_type.num_params
 
     def _adjust_relative(self, opcode_type: OpcodeType, positions: List[int]):
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+from image_cache import Image, image_digest
+from intcode import Program
+from program_pool import ProgramPool
+
+MAXSIZE = 100_000
+
+
+class RunMemo:
+    """Outputs of pure intcode runs, keyed by (image hash, inputs) and evicted least recently used first.
+    A run is pure when the program starts from a state fixed by its image, i.e. straight after a reset or
+    after running from reset without any input, and its only inputs are the ones given. With a path, the
+    memo is loaded from that file if it exists and written back by save()."""
+
+    def __init__(self, maxsize: int = MAXSIZE, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.cache: OrderedDict[Tuple[str, Tuple[int, ...]], Tuple[int, ...]] = OrderedDict()
+        # Hash of each list image we have seen, holding on to the list so its id can't be reused
+        self.digests: Dict[int, Tuple[Sequence[int], str]] = {}
+        self.hits = self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def __enter__(self) -> RunMemo:
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.path is not None:
+            self.save()
+
+    def key(self, image: Sequence[int], inputs: Iterable[int]) -> Tuple[str, Tuple[int, ...]]:
+        if isinstance(image, Image):
+            return image.digest, tuple(inputs)
+        seen = self.digests.get(id(image))
+        if seen is None:
+            seen = self.digests[id(image)] = image, image_digest(image)
+        return seen[1], tuple(inputs)
+
+    def run(self, program: Union[Program, ProgramPool], inputs: Iterable[int]) -> Tuple[int, ...]:
+        """Outputs of a fork of program, or of a program from a pool, given inputs.
+        It runs until it terminates or wants more input."""
+        key = self.key(program.initial_memory, inputs)
+        outputs = self.cache.get(key)
+        if outputs is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return outputs
+        self.misses += 1
+        if isinstance(program, ProgramPool):
+            outputs = self.cache[key] = tuple(program.run(key[1]))
+        else:
+            probe = program.fork()
+            probe.feed(key[1])
+            probe.run()
+            outputs = self.cache[key] = tuple(probe.outputs)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return outputs
+
+    def save(self, path: Optional[str] = None):
+        entries = [[image, list(inputs), list(outputs)] for (image, inputs), outputs in self.cache.items()]
+        with open(path or self.path, 'w') as f:
+            json.dump(entries, f)
+
+    def load(self, path: str):
+        with open(path, 'r') as f:
+            for image, inputs, outputs in json.load(f):
+                self.cache[image, tuple(inputs)] = tuple(outputs)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
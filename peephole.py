@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from intcode import MAX_INSTRUCTION_LENGTH, ClosureCompiler, Engine, Memory, OpcodeType, Operator, Program, Status
+
+ARITHMETIC = (OpcodeType.ADD, OpcodeType.MULTIPLY)
+COMPARE = (OpcodeType.LESS_THAN, OpcodeType.EQUALS)
+JUMP = (OpcodeType.JUMP_IF_TRUE, OpcodeType.JUMP_IF_FALSE)
+ADJUST = (OpcodeType.ADJUST_RELATIVE,)
+
+# Longest first. Anything that can stop the program or produce output is left out, so a fused
+# closure only ever stops early to let code it has just overwritten be translated again.
+PATTERNS: List[Tuple[Tuple[OpcodeType, ...], ...]] = [
+    (ARITHMETIC, COMPARE, JUMP),  # bump a loop counter, test it and branch
+    (COMPARE, JUMP),  # compare then branch
+    (ARITHMETIC, JUMP),  # push a return address then call
+    (ADJUST, JUMP),  # drop a stack frame then return
+    (ADJUST, ARITHMETIC),  # open a stack frame then push or pop
+    (ARITHMETIC, ADJUST),
+]
+
+
+class Superinstructions:
+    """Builds factories for closures that execute a short sequence of instructions in one dispatch.
+    The body of each instruction is the one ClosureCompiler generates, with its names suffixed by its index."""
+    FACTORY = '''
+def factory(self, {args}):
+    mem, code_addresses = self.memory, self.code_addresses
+    pages, writable = mem.pages, mem.writable
+    {nxts}
+
+    def op():
+{body}
+    return op
+'''
+
+    factories: Dict[Tuple[int, ...], Callable] = {}
+
+    @classmethod
+    def match(cls, ops: Sequence[Operator]) -> int:
+        """Number of leading instructions that make up a superinstruction, 0 if none does"""
+        for pattern in PATTERNS:
+            if len(ops) >= len(pattern) and all(op.opcode_type in types for op, types in zip(ops, pattern)):
+                return len(pattern)
+        return 0
+
+    @classmethod
+    def get_factory(cls, opcodes: Tuple[int, ...]) -> Callable:
+        factory = cls.factories.get(opcodes)
+        if factory is None:
+            factory = cls.factories[opcodes] = cls.build_factory([Operator.get_operator(op) for op in opcodes])
+        return factory
+
+    @classmethod
+    def build_factory(cls, ops: List[Operator]) -> Callable:
+        args, nxts, bodies = [], [], []
+        for k, op in enumerate(ops):
+            n, num_params = f'_{k}', op.opcode_type.num_params
+            args += [f'addr{n}'] + [f'p{i}{n}' for i in range(num_params)]
+            nxts.append(f'nxt{n} = addr{n} + {num_params + 1}')
+            body = ClosureCompiler.body(op, n)
+            bodies.append(body if k == len(ops) - 1 else body.removesuffix(ClosureCompiler.NEXT.format(n=n)))
+        source = cls.FACTORY.format(
+            args=', '.join(args), nxts='\n    '.join(nxts), body=ClosureCompiler.indent(''.join(bodies), 8)
+        )
+        namespace = {'Status': Status}
+        exec(source, namespace)
+        return namespace['factory']
+
+
+class FusedProgram(Program):
+    """Runs the threaded engine with common instruction sequences fused into superinstructions.
+    A write anywhere inside a fused sequence drops it, and the code is translated again from where the
+    write left off. A step budget counts dispatches, so it can be overrun by up to two instructions."""
+
+    def __init__(self, line: Union[str, List[int]], engine: Engine = Engine.THREADED,
+                 input_provider: Optional[Callable[[], Optional[int]]] = None,
+                 output_sink: Optional[Callable[[int], None]] = None):
+        super().__init__(line, engine, input_provider, output_sink)
+
+    def set_memory(self, memory: Memory):
+        super().set_memory(memory)
+        # Starts of the superinstructions covering each address, for the words past the reach of invalidate.
+        # Sequences can overlap, as a jump can land inside one and start another.
+        self.fused: Dict[int, Set[int]] = {}
+        self.spans: Dict[int, range] = {}
+
+    def translate(self, ptr: int) -> Callable[[], Optional[int]]:
+        instructions, start = [], ptr
+        for _ in range(max(len(pattern) for pattern in PATTERNS)):
+            try:
+                instructions.append(self.fetch_at(ptr))
+            except ValueError:
+                break
+            ptr += 1 + instructions[-1][0].opcode_type.num_params
+            if instructions[-1][0].opcode_type not in ARITHMETIC + COMPARE + ADJUST:
+                break
+        count = Superinstructions.match([op for op, _ in instructions])
+        if count < 2:
+            return super().translate(start)
+
+        opcodes, args, ptr = [], [], start
+        for op, params in instructions[:count]:
+            opcodes.append(self.memory[ptr])
+            args += [ptr, *params]
+            ptr += 1 + len(params)
+        op = self.threaded[start] = Superinstructions.get_factory(tuple(opcodes))(self, *args)
+        self.drop(start)
+        self.spans[start] = range(start, ptr)
+        for address in self.spans[start]:
+            self.fused.setdefault(address, set()).add(start)
+        return op
+
+    def invalidate(self, pos: int):
+        for start in list(self.fused.get(pos, ())):
+            self.threaded.pop(start, None)
+            self.drop(start)
+        # Closures that start within reach are dropped by the base class, so their spans go with them
+        for start in range(pos - MAX_INSTRUCTION_LENGTH + 1, pos + 1):
+            self.drop(start)
+        super().invalidate(pos)
+        if pos in self.fused:
+            self.code_addresses.add(pos)
+
+    def drop(self, start: int):
+        """Forgets the span of the superinstruction at start"""
+        for address in self.spans.pop(start, ()):
+            starts = self.fused[address]
+            starts.discard(start)
+            if not starts:
+                del self.fused[address]
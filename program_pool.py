@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Sequence, Type, Union
+
+from image_cache import Image
+from intcode import PAGE_BITS, Engine, Program
+
+
+class ProgramPool:
+    """Hands out programs for one image, all at the same starting point: the image booted until it first
+    waits for input, unless boot is False. A released program is reset in place. Every page written
+    during its run is a copy, so putting back the starting point's page objects undoes the run, and only
+    the dirtied pages are touched. The program keeps its decoded and translated code across resets
+    unless the run left any of that code changed."""
+
+    def __init__(self, line: Union[str, Sequence[int]], engine: Engine = Engine.THREADED, boot: bool = True,
+                 program_type: Type[Program] = Program):
+        image = Image.parse(line) if isinstance(line, str) else line
+        self.template = program_type.from_image(image, engine)
+        if boot:
+            self.template.run()
+        self.start = self.template.snapshot()
+        self.free: List[Program] = []
+
+    @property
+    def initial_memory(self) -> Sequence[int]:
+        return self.template.initial_memory
+
+    def acquire(self) -> Program:
+        return self.free.pop() if self.free else self.template.fork()
+
+    def release(self, program: Program):
+        self.reset(program)
+        self.free.append(program)
+
+    def run(self, inputs: Iterable[int]) -> List[int]:
+        """Outputs of a pooled program given inputs, run until it terminates or wants more input"""
+        program = self.acquire()
+        program.feed(inputs)
+        program.run()
+        outputs = program.drain()
+        self.release(program)
+        return outputs
+
+    def reset(self, program: Program):
+        memory, start = program.memory, self.start.memory
+        dirty = {key for key, page in memory.pages.items() if start.pages.get(key) is not page}
+        code_changed = any(
+            memory[address] != start[address]
+            for address in program.code_addresses if address >> PAGE_BITS in dirty
+        )
+        for key in dirty:
+            page = start.pages.get(key)
+            if page is None:
+                del memory.pages[key]
+            else:
+                memory.pages[key] = page
+        memory.writable.clear()
+        if code_changed:
+            program.set_memory(memory)
+            program.inherit_code(self.template)
+
+        snapshot = self.start
+        program.ptr, program.relative_base, program.status = snapshot.ptr, snapshot.relative_base, snapshot.status
+        program.input_handler.values.clear()
+        program.input_handler.values.extend(snapshot.inputs)
+        program.outputs.clear()
+        program.outputs.extend(snapshot.outputs)
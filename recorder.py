@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import zlib
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+from image_cache import image_digest
+from intcode import InputHandler, OutputSink, Program, Status
+
+
+class Trace:
+    """The inputs a run consumed and the outputs it produced, in order, for the image with the given digest.
+    Each checkpoint is (inputs consumed, outputs produced, state checksum) at a point where the run stopped."""
+
+    def __init__(self, image: str, inputs: Optional[List[int]] = None, outputs: Optional[List[int]] = None,
+                 checkpoints: Optional[List[Tuple[int, int, int]]] = None):
+        self.image = image
+        self.inputs = inputs if inputs is not None else []
+        self.outputs = outputs if outputs is not None else []
+        self.checkpoints = checkpoints if checkpoints is not None else []
+
+    def save(self, path: str):
+        """zlib-compressed JSON, which keeps long runs of small joystick or direction inputs compact"""
+        data = {'image': self.image, 'inputs': self.inputs, 'outputs': self.outputs, 'checkpoints': self.checkpoints}
+        with open(path, 'wb') as f:
+            f.write(zlib.compress(json.dumps(data, separators=(',', ':')).encode()))
+
+    @classmethod
+    def load(cls, path: str) -> Trace:
+        with open(path, 'rb') as f:
+            data = json.loads(zlib.decompress(f.read()))
+        return cls(data['image'], data['inputs'], data['outputs'], [tuple(c) for c in data['checkpoints']])
+
+
+class RecordingInputHandler(InputHandler):
+    def __init__(self, handler: InputHandler, log: List[int]):
+        super().__init__(handler.provider)
+        self.values = handler.values
+        self.log = log
+
+    def get_input(self) -> int:
+        val = self.values.popleft()
+        self.log.append(val)
+        return val
+
+
+class RecordingOutputs(deque):
+    """Logs each output, then queues it"""
+    def __init__(self, outputs: deque, log: List[int]):
+        super().__init__(outputs)
+        self.log = log
+
+    def append(self, val: int):
+        self.log.append(val)
+        super().append(val)
+
+    def extend(self, vals: Iterable[int]):
+        for val in vals:
+            self.append(val)
+
+
+class RecordingSink(OutputSink):
+    """Logs each output, then hands it to the callback of the sink it replaces.
+    It is still an OutputSink, so run keeps refusing to count its outputs."""
+    def __init__(self, sink: OutputSink, log: List[int]):
+        super().__init__(sink.callback)
+        self.log = log
+
+    def append(self, val: int):
+        self.log.append(val)
+        self.callback(val)
+
+    def extend(self, vals: Iterable[int]):
+        for val in vals:
+            self.append(val)
+
+
+class Recorder:
+    """Records a program's input and output into a Trace. The program's queues are swapped for logging ones,
+    so drivers that reach them through the program carry on as before. Runs that go through the recorder
+    also checkpoint a state checksum every checksum_every stops, so a replay can be checked against them."""
+
+    def __init__(self, program: Program, checksum_every: int = 1):
+        self.program = program
+        self.trace = Trace(image_digest(program.initial_memory))
+        self.checksum_every = checksum_every
+        self.stops = 0
+        program.input_handler = RecordingInputHandler(program.input_handler, self.trace.inputs)
+        program.outputs = RecordingSink(program.outputs, self.trace.outputs) \
+            if isinstance(program.outputs, OutputSink) else RecordingOutputs(program.outputs, self.trace.outputs)
+        # Translated code has the old queues bound, so it has to be thrown away
+        program.set_memory(program.memory)
+
+    def run(self, max_steps: Optional[int] = None, until_outputs: Optional[int] = None):
+        self.program.run(max_steps, until_outputs)
+        if self.program.status == Status.YIELDED:
+            return
+        self.stops += 1
+        if self.checksum_every and self.stops % self.checksum_every == 0:
+            self.trace.checkpoints.append(
+                (len(self.trace.inputs), len(self.trace.outputs), checksum(self.program))
+            )
+
+    def save(self, path: str):
+        self.trace.save(path)
+
+
+def replay(program: Program, trace: Trace, inputs: Optional[int] = None, verify: bool = False) -> Program:
+    """Brings a freshly reset program to where the recording was once it had consumed the first `inputs`
+    recorded inputs (all of them by default), by feeding it those and running it. With verify, the run stops
+    at every checkpoint on the way and raises a ValueError if its output or state differs from the recording."""
+    if image_digest(program.initial_memory) != trace.image:
+        raise ValueError("The trace was recorded from a different image")
+    inputs = len(trace.inputs) if inputs is None else inputs
+    fed = 0
+    for consumed, produced, expected in trace.checkpoints if verify else []:
+        if consumed > inputs:
+            break
+        program.feed(trace.inputs[fed:consumed])
+        fed = consumed
+        program.run()
+        if list(program.outputs)[:produced] != trace.outputs[:produced] or checksum(program) != expected:
+            raise ValueError(f"Replay diverged from the recording after {consumed} inputs")
+    program.feed(trace.inputs[fed:inputs])
+    program.run()
+    return program
+
+
+def checksum(program: Program) -> int:
+    """CRC of the pointer, relative base and every page that isn't all zeros. Only meaningful while the
+    program is stopped, as engines keep some of that state in locals while they run."""
+    crc = zlib.crc32(f'{program.ptr},{program.relative_base}'.encode())
+    for key in sorted(program.memory.pages):
+        page = program.memory.pages[key]
+        if any(page):
+            crc = zlib.crc32(f'{key}:{",".join(map(str, page))}'.encode(), crc)
+    return crc
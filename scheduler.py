@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from intcode import Program, Status
+
+BUDGET = 1_000
+
+
+class Scheduler:
+    """Round-robins a set of programs, giving each one a step budget per turn so a runaway program can't starve
+    the others. A program that blocks on input is parked and is only put back in the ready queue by send().
+    After every turn on_turn is called with the program that just ran, e.g. to route its output."""
+
+    def __init__(self, budget: int = BUDGET, on_turn: Optional[Callable[[Program], None]] = None):
+        self.budget = budget
+        self.on_turn = on_turn
+        self.ready: Deque[Program] = deque()
+        self.parked: List[Program] = []
+        self.terminated: List[Program] = []
+        self.budgets: Dict[Program, int] = {}
+
+    @property
+    def idle(self) -> bool:
+        return not self.ready
+
+    def add(self, program: Program, budget: Optional[int] = None):
+        self.budgets[program] = budget or self.budget
+        self.ready.append(program)
+
+    def send(self, program: Program, val: int):
+        program.add_input_value(val)
+        if program in self.parked:
+            self.parked.remove(program)
+            self.ready.append(program)
+
+    def step(self) -> Program:
+        program = self.ready.popleft()
+        program.run(self.budgets[program])
+        if program.status == Status.YIELDED:
+            self.ready.append(program)
+        elif program.status == Status.TERMINATED:
+            self.terminated.append(program)
+        else:
+            self.parked.append(program)
+        if self.on_turn:
+            self.on_turn(program)
+        return program
+
+    def run(self):
+        """Runs until every program has either terminated or is parked waiting for input"""
+        while self.ready:
+            self.step()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable, Iterator, List
+
+from Day21 import SCRIPTS
+from springscript import JUMP, SENSORS, SpringscriptSearch
+
+# Hulls the stand-in droid has to cross, in the style of the Day21 failure renderings
+HULLS = {
+    'WALK': ["#####.###########", "#####...#########", "#####..#.########"],
+    'RUN': [
+        "#####.###########", "#####...#########", "#####..#.########", "#####.#..########",
+        "#####.##.#.##.###", "#####.#.##...####", "#####..###.#.####", "#####.#.#.##..###",
+        "#####...##.##.###", "#####.##.##..####", "#####.#.##..#.###", "#####..##.##.####",
+    ],
+}
+DAMAGE = 19_350_000
+# The most instructions a script found for the hulls above may take, besides the mode command
+MAX_LENGTH = {'WALK': 5, 'RUN': 9}
+
+
+class StandInDroid:
+    """Answers springscript the way the Day21 droid does, on hulls we know, without an intcode image.
+    It reads the script with its own interpreter rather than the search's, so the two check each other."""
+
+    def __init__(self, hulls: List[str], sensors: str):
+        self.hulls = hulls
+        self.sensors = sensors
+
+    def run(self, inputs: Iterable[bytes]) -> Iterator[List[int]]:
+        for text in inputs:
+            commands = text.decode().split('\n')[:-1]
+            output = "Input instructions:\n\nWalking...\n\n"
+            fell = next((hull for hull in self.hulls if not self.crosses(commands, hull)), None)
+            if fell is None:
+                yield list(output.encode()) + [DAMAGE]
+                continue
+            frame = '\n'.join(['.' * len(fell)] * 2 + ['@' + '.' * (len(fell) - 1), fell])
+            yield list(f"{output}Didn't make it across:\n\n{frame}\n\n".encode())
+
+    def crosses(self, commands: List[str], hull: str) -> bool:
+        x = 0
+        while x < len(hull):
+            if hull[x] == '.':
+                return False
+            registers = {
+                sensor: x + 1 + i >= len(hull) or hull[x + 1 + i] == '#' for i, sensor in enumerate(self.sensors)
+            }
+            registers['T'] = registers['J'] = False
+            for command in commands[:-1]:
+                op, a, b = command.split()
+                registers[b] = registers[a] and registers[b] if op == 'AND' else \
+                    registers[a] or registers[b] if op == 'OR' else \
+                    not registers[a]
+            x += JUMP if registers['J'] else 1
+        return True
+
+
+def main():
+    for mode, hulls in HULLS.items():
+        droid = StandInDroid(hulls, SENSORS[mode])
+        assert all(droid.crosses(SCRIPTS[mode], hull) for hull in hulls), f"The known {mode} script falls"
+        start = time.perf_counter()
+        search = SpringscriptSearch('', mode)
+        commands = search.search(droid.run)
+        assert all(droid.crosses(commands, hull) for hull in hulls), commands
+        assert search.damage == DAMAGE and len(commands) - 1 <= MAX_LENGTH[mode], commands
+        print(f"{mode}: {len(commands) - 1} instructions after learning {len(search.hulls)} hulls, "
+              f"{len(search.tried)} scripts tried, in {time.perf_counter() - start:.2f}s")
+        print('\n'.join(commands))
+
+
+if __name__ == '__main__':
+    main()
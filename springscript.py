@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+from itertools import combinations, islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from ascii import Decoder
+from executor import ProgramExecutor
+from intcode import Engine
+
+SENSORS = {'WALK': 'ABCD', 'RUN': 'ABCDEFGHI'}
+MAX_INSTRUCTIONS = 15
+JUMP = 4
+# Bounds on the formulas tried for each way of jumping
+MAX_LITERALS = 3
+MAX_TERMS = 3
+SHORTLIST = 40
+PLANS = 256
+COVERS = 8
+BATCH = 64
+
+Script = Tuple[str, ...]
+# A conjunction or disjunction of sensors, each with whether it is read as is or negated
+Term = Tuple[Tuple[str, bool], ...]
+
+
+class Hull(NamedTuple):
+    """A stretch of hull the droid fell through, '#' for ground and '.' for a hole, and where the droid started"""
+    tiles: str
+    start: int
+
+    @classmethod
+    def from_failure(cls, lines: Sequence[str]) -> Optional[Hull]:
+        """The hull in the first frame the droid draws once it has fallen, if it drew one"""
+        frame = []
+        for line in lines:
+            if line and set(line) <= set('#.@'):
+                frame.append(line)
+            elif frame:
+                break
+        if not frame:
+            return None
+        return cls(frame[-1], next((row.index('@') for row in frame if '@' in row), 0))
+
+    def reading(self, x: int, num_sensors: int) -> int:
+        """Bit i is set when the sensor i + 1 tiles ahead of x sees ground. The hull is solid past its end."""
+        return sum(
+            1 << i for i in range(num_sensors) if x + 1 + i >= len(self.tiles) or self.tiles[x + 1 + i] == '#'
+        )
+
+
+class Walk(NamedTuple):
+    """A hull with the index of the sensor reading at each tile the droid can stand on"""
+    tiles: str
+    start: int
+    readings: List[Optional[int]]
+
+
+class SpringscriptSearch:
+    """Finds a springscript that gets the droid across by learning the hull from each failure.
+    Every sensor reading the droid can take on the hulls learned so far gets a bit, so a register holds the
+    truth table of its value over all of them and a script runs on every reading at once in the simulator.
+    Candidates come from ways of jumping that cross every learned hull: the readings to jump at and those
+    to walk on are covered with a few short terms, as a DNF or a CNF, and compiled into springscript.
+    Those the simulator gets across are confirmed on the droid a batch at a time on a process pool,
+    shortest first. A script that fails there draws a hull we hadn't learned yet, and the search starts
+    over with it, until a script makes it across."""
+
+    def __init__(self, line: str, mode: str = 'WALK', batch: int = BATCH, processes: Optional[int] = None):
+        self.line = line
+        self.mode = mode
+        self.sensors = SENSORS[mode]
+        self.batch = batch
+        self.processes = processes
+        self.hulls: List[Hull] = []
+        self.tried: Set[Script] = set()
+        self.damage: Optional[int] = None
+
+    def find(self) -> List[str]:
+        """The script, ending with the mode command. The hull damage the droid reported is kept in damage."""
+        with ProgramExecutor(self.line, Engine.THREADED, self.processes) as executor:
+            return self.search(executor.map)
+
+    def search(self, run: Callable[[Iterable[bytes]], Iterable[List[int]]]) -> List[str]:
+        """find, with run giving the droid's outputs for each script it is fed, in order"""
+        while True:
+            scripts = list(islice(self.candidates(), self.batch))
+            if not scripts:
+                raise ValueError(f"No springscript of up to {MAX_INSTRUCTIONS} instructions was found")
+            learned = False
+            for script, outputs in zip(scripts, run(self.encode(script) for script in scripts)):
+                self.tried.add(script)
+                decoder = Decoder()
+                lines = list(decoder.feed(outputs))
+                if decoder.result is not None:
+                    self.damage = decoder.result
+                    return self.commands(script)
+                hull = Hull.from_failure(lines)
+                if hull is not None and hull not in self.hulls:
+                    self.hulls.append(hull)
+                    learned = True
+            if not learned:
+                raise ValueError("The droid fell on a hull the simulator has it crossing")
+
+    def encode(self, script: Script) -> bytes:
+        return ('\n'.join(self.commands(script)) + '\n').encode()
+
+    def commands(self, script: Script) -> List[str]:
+        return list(script) + [self.mode]
+
+    def candidates(self) -> Iterator[Script]:
+        """Untried scripts that the simulator gets across every learned hull, shortest first"""
+        num_sensors = len(self.sensors)
+        readings = sorted({
+            hull.reading(x, num_sensors)
+            for hull in self.hulls for x in range(hull.start, len(hull.tiles)) if hull.tiles[x] == '#'
+        })
+        index = {reading: k for k, reading in enumerate(readings)}
+        walks = [
+            Walk(hull.tiles, hull.start, [
+                index[hull.reading(x, num_sensors)] if tile == '#' and x >= hull.start else None
+                for x, tile in enumerate(hull.tiles)
+            ])
+            for hull in self.hulls
+        ]
+        full = (1 << len(readings)) - 1
+        registers = {
+            sensor: sum(1 << k for k, reading in enumerate(readings) if reading >> i & 1)
+            for i, sensor in enumerate(self.sensors)
+        }
+
+        scripts = set()
+        for jump, stay in islice(self.plans(walks), PLANS):
+            for terms, outer in [(self.cover(jump, stay, registers, full), 'OR'),
+                                 (self.cover(stay, jump, registers, full), 'AND')]:
+                for chosen in terms:
+                    if outer == 'AND':
+                        chosen = [tuple((sensor, not positive) for sensor, positive in term) for term in chosen]
+                    scripts.add(self.compile(chosen, outer))
+        for script in sorted(scripts, key=lambda script: (len(script), script)):
+            if len(script) > MAX_INSTRUCTIONS or script in self.tried:
+                continue
+            jumps = self.evaluate(script, registers, full)
+            if all(self.crosses(jumps, walk) for walk in walks):
+                yield script
+
+    @staticmethod
+    def plans(walks: List[Walk]) -> Iterator[Tuple[int, int]]:
+        """Ways of crossing every walk, as the readings to jump at and the readings to walk on.
+        A reading always gets the same answer, so it can't be jumped at on one tile and walked on at another."""
+        def cross(w: int, x: int, jump: int, stay: int) -> Iterator[Tuple[int, int]]:
+            if w == len(walks):
+                yield jump, stay
+                return
+            tiles, readings = walks[w].tiles, walks[w].readings
+            if x >= len(tiles):
+                yield from cross(w + 1, walks[w + 1].start if w + 1 < len(walks) else 0, jump, stay)
+                return
+            if tiles[x] == '.':
+                return
+            bit = 1 << readings[x]
+            if not jump & bit:
+                yield from cross(w, x + 1, jump, stay | bit)
+            if not stay & bit:
+                yield from cross(w, x + JUMP, jump | bit, stay)
+
+        seen = set()
+        for plan in cross(0, walks[0].start if walks else 0, 0, 0):
+            if plan not in seen:
+                seen.add(plan)
+                yield plan
+
+    def cover(self, cover: int, avoid: int, registers: Dict[str, int], full: int) -> List[List[Term]]:
+        """Sets of at most MAX_TERMS conjunctions that are all false on avoid and between them true on all of
+        cover, cheapest first. Only the conjunctions that no literal can be dropped from are considered."""
+        if not cover:
+            return [[]]
+        literals = [
+            ((sensor, positive), table if positive else ~table & full)
+            for sensor, table in registers.items() for positive in (True, False)
+        ]
+        implicants: List[Tuple[Term, int]] = []
+        level: List[Tuple[Tuple[int, ...], int]] = [((), full)]
+        for _ in range(MAX_LITERALS):
+            next_level = []
+            for chosen, table in level:
+                for k in range(chosen[-1] + 1 if chosen else 0, len(literals)):
+                    new_table = table & literals[k][1]
+                    if not new_table & cover:
+                        continue
+                    new = chosen + (k,)
+                    if new_table & avoid:
+                        next_level.append((new, new_table))
+                    elif not any(set(term) <= set(new) for term, _ in implicants):
+                        implicants.append((new, new_table))
+            level = next_level
+
+        costs = {term: len(self.load(self.term(term, literals), 'AND', 'T')) for term, _ in implicants}
+        implicants.sort(key=lambda implicant: (-bin(implicant[1] & cover).count('1'), costs[implicant[0]]))
+        shortlist = implicants[:SHORTLIST]
+        covers = [
+            chosen for size in range(1, MAX_TERMS + 1) for chosen in combinations(shortlist, size)
+            if self.covered(chosen, cover)
+        ]
+        if not covers:
+            covers = [self.greedy(implicants, cover, costs)]
+        covers.sort(key=lambda chosen: sum(costs[term] + 1 for term, _ in chosen))
+        return [[self.term(term, literals) for term, _ in chosen] for chosen in covers[:COVERS] if chosen]
+
+    @staticmethod
+    def covered(chosen: Sequence[Tuple[Tuple[int, ...], int]], cover: int) -> bool:
+        table = 0
+        for _, term_table in chosen:
+            table |= term_table
+        return table & cover == cover
+
+    @staticmethod
+    def greedy(implicants: List[Tuple[Tuple[int, ...], int]], cover: int,
+               costs: Dict[Tuple[int, ...], int]) -> List[Tuple[Tuple[int, ...], int]]:
+        chosen, left = [], cover
+        while left:
+            best = max(implicants, key=lambda implicant: bin(implicant[1] & left).count('1') / costs[implicant[0]])
+            if not best[1] & left:
+                return []
+            chosen.append(best)
+            left &= ~best[1]
+        return chosen
+
+    @staticmethod
+    def term(chosen: Tuple[int, ...], literals: List[Tuple[Tuple[str, bool], int]]) -> Term:
+        return tuple(literals[k][0] for k in chosen)
+
+    @classmethod
+    def compile(cls, terms: List[Term], outer: str) -> Script:
+        """Springscript leaving J as the OR of conjunctions, or the AND of disjunctions"""
+        if not terms:
+            # An empty OR never jumps and an empty AND always does; T is still false at the start
+            return () if outer == 'OR' else ('NOT T J',)
+        inner = 'AND' if outer == 'OR' else 'OR'
+        # A lone sensor folds straight into J, so those go last and the first term is built in J itself
+        terms = sorted(terms, key=lambda term: len(term) == 1 and term[0][1])
+        script = []
+        for n, term in enumerate(terms):
+            if n and len(term) == 1 and term[0][1]:
+                script.append(f'{outer} {term[0][0]} J')
+            elif n:
+                script += cls.load(term, inner, 'T') + [f'{outer} T J']
+            else:
+                script += cls.load(term, inner, 'J')
+        return tuple(script)
+
+    @staticmethod
+    def load(term: Term, inner: str, register: str) -> List[str]:
+        """Springscript leaving the register as the term, whatever it held before"""
+        negated = [sensor for sensor, positive in term if not positive]
+        plain = [sensor for sensor, positive in term if positive]
+        if len(negated) == 1:
+            script = [f'NOT {negated[0]} {register}']
+        elif len(negated) == 2 and register == 'J':
+            # T is free while the first term is built, which saves an instruction
+            script = [f'NOT {negated[0]} J', f'NOT {negated[1]} T', f'{inner} T J']
+        elif negated:
+            # NOT A AND NOT B is NOT (A OR B), and NOT A OR NOT B is NOT (A AND B)
+            dual = 'OR' if inner == 'AND' else 'AND'
+            script = [f'NOT {negated[0]} {register}', f'NOT {register} {register}'] + \
+                [f'{dual} {sensor} {register}' for sensor in negated[1:]] + [f'NOT {register} {register}']
+        else:
+            script = [f'NOT {plain[0]} {register}', f'NOT {register} {register}']
+            plain = plain[1:]
+        return script + [f'{inner} {sensor} {register}' for sensor in plain]
+
+    @staticmethod
+    def evaluate(script: Script, registers: Dict[str, int], full: int) -> int:
+        """J's truth table after running the script on every reading at once"""
+        values = dict(registers, T=0, J=0)
+        for instruction in script:
+            op, x, y = instruction.split()
+            values[y] = values[x] & values[y] if op == 'AND' else \
+                values[x] | values[y] if op == 'OR' else \
+                ~values[x] & full
+        return values['J']
+
+    @staticmethod
+    def crosses(jumps: int, walk: Walk) -> bool:
+        x, tiles, readings = walk.start, walk.tiles, walk.readings
+        while x < len(tiles):
+            if tiles[x] == '.':
+                return False
+            x += JUMP if jumps >> readings[x] & 1 else 1
+        return True